@@ -1,8 +1,28 @@
+import math
+import os
 import streamlit as st
 import pandas as pd
-import time
-from utils.data_loader import load_data_from_file, load_sample_data, validate_dataframe_columns, validate_dataframe
-from utils.email_sender import send_single_email, test_smtp_connection, markdown_to_html
+from utils.data_loader import load_columns_cached, preview_data_from_file_cached, apply_column_mapping_cached, validate_contacts_cached, upload_digest, mapping_key, load_sample_data, validate_dataframe_columns, validate_dataframe, count_data_rows, iter_contact_chunks, validate_contacts, STATUS_LABELS, STATUS_OK, STATUS_DUPLICATE, STATUS_ROLE_ACCOUNT, STATUS_MISSING_NAME, extract_first_name, needs_name_extraction, template_field_name, frame_nbytes, format_bytes
+from utils.email_sender import test_smtp_connection, markdown_to_html, encode_attachments, attachment_cache_size, fill_placeholders, template_fields
+from utils.send_engine import iter_campaign, rate_per_second, SenderPool, SenderAccount
+from utils.quota_ledger import QuotaLedger, PROVIDER_DAILY_QUOTAS, DAY_SECONDS, account_quotas
+from utils.mx_resolver import MXResolver, HAS_DNS
+from utils.async_sender import iter_campaign_async
+from utils.send_plan import compile_send_plan, iter_planned_recipients, load_suppression_list
+from utils.job_queue import submit_job, list_jobs, cancel_job, job_failures, active_workers
+from utils.delivery_journal import campaign_id, journal_summary, finished_addresses, reset_journal
+from utils.delivery_metrics import DeliveryMetrics, METRICS_FILE
+from utils.results_store import HAS_PARQUET, SENT, FAILED, REJECTED
+from utils.live_campaign import LiveCampaign, ROLLING_WINDOW_SECONDS
+
+SMTP_HOSTS = [
+    "smtp.gmail.com",
+    "smtp.office365.com",
+    "smtp.mail.yahoo.com",
+    "smtp.sendgrid.net",
+    "smtp.mailgun.org"
+]
+SMTP_PORTS = [587, 465, 2525]
 
 # Page configuration
 st.set_page_config(
@@ -12,6 +32,26 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Rows read up front for column mapping, and kept for preview when
+# streaming a large file
+PREVIEW_ROWS = 100
+
+# How often the Send tab refreshes the status of queued campaigns
+JOB_POLL_SECONDS = 2
+
+# How often the live campaign dashboard is redrawn; sending never waits for it
+DASHBOARD_REFRESH_SECONDS = 0.25
+
+# Detailed results are shown one page at a time
+RESULT_PAGE_SIZES = [50, 200, 1000]
+RESULT_FILTERS = {
+    "All recipients": None,
+    "Failed or rejected": (FAILED, REJECTED),
+    "Rejected permanently": (REJECTED,),
+    "Still failing after retries": (FAILED,),
+    "Sent": (SENT,),
+}
+
 st.logo("staticfiles/dftlabs_logo.png")
 
 st.markdown("""
@@ -53,50 +93,280 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def extract_first_name(full_name):
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_monitor():
     """
-    Extract first name from a full name string.
-    Handles cases like "John Doe", "John", "John M. Doe", etc.
-    Returns the original string if no space is found.
+    Status of campaigns queued for the background worker; reruns on its own
+    so the rest of the page is not redrawn while it polls
     """
-    if pd.isna(full_name):
-        return ""
-
-    # Convert to string and strip whitespace
-    name_str = str(full_name).strip()
-
-    # Split on spaces and return first part :cite[2]:cite[6]
-    parts = name_str.split()
-    return parts[0] if parts else name_str
+    if not active_workers():
+        st.warning(
+            "⚠️ No background worker is running. Start one with `python worker.py`.")
+    jobs = list_jobs()
+    if not jobs:
+        st.caption("No campaigns queued yet.")
+        return
+    for job in jobs:
+        done = job['sent'] + job['failed']
+        status = "cancelling" if job['cancel_requested'] and job['status'] == 'running' else job['status']
+        with st.container(border=True):
+            info_col, action_col = st.columns([4, 1])
+            with info_col:
+                st.markdown(f"**#{job['id']} {job['name'] or ''}** · {status}")
+                st.progress(min(1.0, done / max(1, job['total'])),
+                            text=f"{done:,}/{job['total']:,} processed · ✅ {job['sent']:,} sent · ❌ {job['failed']:,} failed")
+                if job['error']:
+                    st.error(job['error'])
+            with action_col:
+                if job['status'] in ('queued', 'running') and not job['cancel_requested']:
+                    if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                        cancel_job(job['id'])
+                        st.rerun()
+            if job['failed']:
+                with st.expander("View failures"):
+                    for result in job_failures(job['id']):
+                        st.error(result['message'])
+
+
+def account_limits(prefix):
+    """
+    Weight, concurrency, rate and quota inputs for one sender account, as
+    the smtp_config keys SenderPool reads
+    """
+    weight_col, concurrency_col, rate_col = st.columns(3)
+    weight = weight_col.number_input(
+        "Weight", min_value=0.1, value=1.0, step=0.5,
+        help="Share of the campaign relative to the other accounts", key=f"{prefix}_weight")
+    concurrency = concurrency_col.number_input(
+        "Connections", min_value=0, value=0,
+        help="Messages in flight from this account (0 = no own limit)", key=f"{prefix}_concurrency")
+    rate = rate_col.number_input(
+        "Per minute", min_value=0.0, value=0.0,
+        help="Ceiling on this account's sending rate (0 = unlimited)", key=f"{prefix}_rate")
+    daily_col, hourly_col = st.columns(2)
+    daily_quota = daily_col.number_input(
+        "Daily quota", min_value=0, value=0,
+        help="Messages per rolling 24 hours (0 = the provider's free-tier limit: "
+        + ", ".join(f"{host} {quota:,}" for host, quota in PROVIDER_DAILY_QUOTAS.items())
+        + "; none for others)", key=f"{prefix}_daily_quota")
+    hourly_quota = hourly_col.number_input(
+        "Hourly quota", min_value=0, value=0,
+        help="Messages per rolling hour (0 = no limit)", key=f"{prefix}_hourly_quota")
+    return {
+        'weight': weight,
+        'max_concurrency': int(concurrency) or None,
+        'max_rate': rate_per_second(rate, 'per minute'),
+        'daily_quota': int(daily_quota) or None,
+        'hourly_quota': int(hourly_quota) or None,
+    }
 
 
-def apply_column_mapping(df, mapping):
+def quota_caption(smtp_config, ledger):
     """
-    Apply column mapping and extract first names if needed
+    "sent today / daily quota" for an account, or just what it sent today
     """
-    mapped_df = df.copy()
+    daily, _ = account_quotas(smtp_config)
+    sent = ledger.sent(SenderAccount(smtp_config).name, DAY_SECONDS)
+    return f"{sent:,}/{daily:,} sent in the last 24h" if daily else f"{sent:,} sent in the last 24h"
 
-    # Apply email mapping
-    if 'email' in mapping and mapping['email']:
-        mapped_df['email'] = df[mapping['email']]
 
-    # Apply first name mapping with extraction if needed
-    if 'first_name' in mapping and mapping['first_name']:
-        source_column = mapping['first_name']
-
-        # Check if this is likely a full name column that needs extraction
-        column_name_lower = source_column.lower()
-        needs_extraction = any(term in column_name_lower for term in [
-                               'name', 'full', 'complete'])
+def sender_pool_settings(smtp_config, ledger):
+    """
+    Sidebar section for sending one campaign from several accounts.
+    Adds the primary account's limits to `smtp_config` and returns the
+    list of smtp_config dicts to pool, the primary account first.
+    """
+    accounts = st.session_state.setdefault('sender_accounts', [])
+    with st.expander(f"👥 Sender pool ({1 + len(accounts)} account{'s' if accounts else ''})"):
+        st.caption("Campaigns are shared across these accounts by weight. Each account sends only "
+                   "what is left of its quota and the rest waits for its window to free up; an "
+                   "account whose login fails hands its recipients to the others.")
+        st.markdown(f"**{smtp_config['sender_email']}** ({smtp_config['host']})")
+        smtp_config.update(account_limits("primary_sender"))
+        st.caption(quota_caption(smtp_config, ledger))
+        for position, account in enumerate(accounts):
+            info_col, remove_col = st.columns([4, 1])
+            info_col.markdown(f"**{account['sender_email']}** ({account['host']}:{account['port']})")
+            info_col.caption(
+                f"Weight {account['weight']:g}"
+                + (f" · {account['max_concurrency']} connections" if account['max_concurrency'] else "")
+                + (f" · {account['max_rate'] * 60:g}/min" if account['max_rate'] else "")
+                + (f" · {account['hourly_quota']:,}/hour" if account['hourly_quota'] else "")
+                + f" · {quota_caption(account, ledger)}")
+            if remove_col.button("✖", key=f"remove_sender_{position}", help="Remove this account"):
+                accounts.pop(position)
+                st.rerun()
+
+        with st.form("add_sender", clear_on_submit=True):
+            st.markdown("**Add an account**")
+            account = {
+                'sender_name': st.text_input("Sender Name", smtp_config['sender_name']),
+                'sender_email': st.text_input("Sender Email"),
+                'password': st.text_input("SMTP Password", type="password"),
+                'host': st.selectbox("SMTP Host", SMTP_HOSTS),
+                'port': st.selectbox("SMTP Port", SMTP_PORTS),
+                'max_messages_per_connection': smtp_config['max_messages_per_connection'],
+            }
+            account.update(account_limits("new_sender"))
+            if st.form_submit_button("➕ Add account"):
+                if not account['sender_email'] or not account['password']:
+                    st.error("An account needs an email address and a password.")
+                elif any(existing['sender_email'] == account['sender_email'] and existing['host'] == account['host']
+                         for existing in [smtp_config] + accounts):
+                    st.error("That account is already in the pool.")
+                else:
+                    accounts.append(account)
+                    st.rerun()
+    return [smtp_config] + accounts
 
-        if needs_extraction:
-            mapped_df['first_name'] = df[source_column].apply(
-                extract_first_name)
-            st.info(f"🔧 Extracting first names from '{source_column}' column")
-        else:
-            mapped_df['first_name'] = df[source_column]
 
-    return mapped_df
+def show_sender_accounts(rows):
+    """
+    Per-account outcome of a pooled campaign (SenderPool.summary rows)
+    """
+    st.dataframe(pd.DataFrame([{
+        'Account': row['account'],
+        'Weight': row['weight'],
+        'Sent': row['sent'],
+        'Failed': row['failed'],
+        'Handed back': row['handed_back'],
+        'Quota left': row['quota_left'],
+        'Status': row['status'],
+    } for row in rows]), hide_index=True, use_container_width=True)
+
+
+def show_delivery_metrics(snapshot):
+    """
+    Where campaign time goes: per-phase latency table plus wire counters
+    """
+    elapsed = max(snapshot['elapsed_s'], 1e-9)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Throughput", f"{(snapshot['sent'] + snapshot['failed']) / elapsed:,.1f}/s")
+    col2.metric("Data sent", f"{snapshot['bytes_sent'] / (1024 * 1024):,.1f} MB")
+    col3.metric("Connections", snapshot['connections'],
+                help=f"{snapshot['reconnects']} reopened after a drop, a 421 or recycling")
+    col4.metric("Retries", sum(snapshot['retries'].values()),
+                help=", ".join(f"{code}: {count}" for code, count in sorted(snapshot['retries'].items()))
+                or "No transient failures")
+    rows = [{
+        'Phase': phase,
+        'Count': figures['count'],
+        'Mean (ms)': figures['mean_ms'],
+        'p50 (ms)': figures['p50_ms'],
+        'p95 (ms)': figures['p95_ms'],
+        'Total (s)': figures['total_s'],
+    } for phase, figures in snapshot['phases'].items()]
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+@st.fragment(run_every=DASHBOARD_REFRESH_SECONDS)
+def campaign_dashboard():
+    """
+    Progress of the campaign sending from this page. Only this fragment is
+    redrawn on each tick; once the campaign ends the whole page reruns to
+    show the results.
+    """
+    live = st.session_state.get('live_campaign')
+    if live is None:
+        return
+    if not live.running:
+        st.rerun()
+    progress = live.progress()
+    done = progress['total']
+    st.progress(min(1.0, done / live.total),
+                text=f"Sent {done:,} of {live.total:,}" + (
+                    f" (last: {progress['last_name']})..." if progress['last_name'] else "..."))
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Throughput", f"{progress['throughput']:,.1f}/s",
+                help=f"Messages completed over the last {ROLLING_WINDOW_SECONDS:.0f} seconds")
+    col2.metric("Error rate", f"{progress['error_rate']:.1%}",
+                help=f"Share of failures over the last {ROLLING_WINDOW_SECONDS:.0f} seconds")
+    col3.metric("ETA", format_duration(progress['eta_s']) if progress['eta_s'] is not None else "–",
+                help=f"Elapsed {format_duration(progress['elapsed_s'])}")
+    col4.metric("Sent / failed", f"{progress['sent']:,} / {progress['failed'] + progress['rejected']:,}")
+    if live.senders is not None:
+        accounts = live.senders.summary()
+        if all(row['status'] != "sending" for row in accounts):
+            st.caption("⏸️ Every sender account has used its quota; sending resumes as soon as one frees up.")
+        with st.expander(f"👥 Sender accounts ({len(accounts)})"):
+            show_sender_accounts(accounts)
+    if live.metrics is not None:
+        with st.expander("⏱️ Delivery metrics"):
+            show_delivery_metrics(live.metrics.snapshot())
+    if live.stopping.is_set():
+        st.caption("Stopping after the messages in flight...")
+    elif st.button("⏹️ Stop Campaign", key="stop_campaign"):
+        live.stop()
+
+
+@st.fragment
+def show_campaign_results(store):
+    """
+    Outcome of the last campaign sent from this page: totals, failure
+    reasons and a filterable table rendered a page at a time. Paging and
+    filtering rerun only this fragment.
+    """
+    counts = store.counts()
+    failure_count = counts['failed'] + counts['rejected']
+
+    st.subheader("📊 Sending Results")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Emails Sent Successfully",
+                  f"{counts['sent']}/{counts['total']}")
+    with col2:
+        st.metric("Failed Attempts", failure_count,
+                  help=f"{counts['rejected']} rejected permanently, {counts['failed']} still failing after retries")
+    with col3:
+        st.metric("Retried", counts['retried'],
+                  help="Recipients that needed more than one attempt")
+
+    with st.expander("View Detailed Results"):
+        if failure_count:
+            st.markdown("**Failure reasons**")
+            st.dataframe(store.failure_reasons(), hide_index=True, use_container_width=True)
+
+        filter_col, size_col, page_col = st.columns(3)
+        with filter_col:
+            shown = st.selectbox("Show", list(RESULT_FILTERS), key="results_filter")
+        with size_col:
+            page_size = st.selectbox("Rows per page", RESULT_PAGE_SIZES, key="results_page_size")
+        rows = store.select(RESULT_FILTERS[shown])
+        pages = max(1, math.ceil(len(rows) / page_size))
+        if st.session_state.get('results_page', 1) > pages:
+            st.session_state.results_page = pages
+        with page_col:
+            page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages,
+                                   value=1, key="results_page")
+        start = (page - 1) * page_size
+        st.dataframe(store.to_frame(rows[start:start + page_size]),
+                     hide_index=True, use_container_width=True)
+        st.caption(f"{len(rows):,} recipients · {store.nbytes / 1024:,.0f} KB of outcome data")
+
+        # Exports are built on first request and kept for this campaign
+        exports = st.session_state.setdefault('results_exports', {})
+        csv_col, parquet_col = st.columns(2)
+        with csv_col:
+            if (shown, 'csv') not in exports:
+                exports[shown, 'csv'] = store.to_csv(rows)
+            st.download_button("⬇️ Download CSV", exports[shown, 'csv'], file_name="campaign_results.csv",
+                               mime="text/csv", key="download_results_csv", on_click="ignore")
+        with parquet_col:
+            if HAS_PARQUET and (shown, 'parquet') not in exports:
+                exports[shown, 'parquet'] = store.to_parquet(rows)
+            st.download_button("⬇️ Download Parquet", exports.get((shown, 'parquet'), b''),
+                               file_name="campaign_results.parquet", key="download_results_parquet",
+                               on_click="ignore", disabled=not HAS_PARQUET,
+                               help=None if HAS_PARQUET else "Requires the pyarrow package")
 
 
 def main():
@@ -114,15 +384,13 @@ def main():
             "Sender Email", "your.email@gmail.com", key="sender_email")
         smtp_config['password'] = st.text_input(
             "SMTP Password", type="password", key="smtp_password")
-        smtp_config['host'] = st.selectbox("SMTP Host", [
-            "smtp.gmail.com",
-            "smtp.office365.com",
-            "smtp.mail.yahoo.com",
-            "smtp.sendgrid.net",
-            "smtp.mailgun.org"
-        ], key="smtp_host")
+        smtp_config['host'] = st.selectbox("SMTP Host", SMTP_HOSTS, key="smtp_host")
         smtp_config['port'] = st.selectbox(
-            "SMTP Port", [587, 465, 2525], key="smtp_port")
+            "SMTP Port", SMTP_PORTS, key="smtp_port")
+        smtp_config['max_messages_per_connection'] = st.number_input(
+            "Messages per connection", min_value=1, max_value=1000, value=100,
+            help="Reconnect after this many emails; lower it if your provider drops long sessions",
+            key="max_messages_per_connection")
 
         if st.button("Test SMTP Connection", key="test_connection"):
             success, message = test_smtp_connection(smtp_config)
@@ -131,12 +399,17 @@ def main():
             else:
                 st.error(message)
 
+        if 'quota_ledger' not in st.session_state:
+            # Shared with the background workers through its database
+            st.session_state.quota_ledger = QuotaLedger()
+        sender_configs = sender_pool_settings(smtp_config, st.session_state.quota_ledger)
+
         # Important notes in sidebar
         st.markdown("---")
         st.subheader("💡 Important Notes")
         st.markdown("""
         - **Gmail Users**: Use an [App Password](https://myaccount.google.com/apppasswords) if 2FA is enabled
-        - **Daily Limits**: Gmail free tier: 500 emails/day
+        - **Daily Limits**: Gmail free tier: 500 emails/day; add more accounts under Sender pool to share larger campaigns
         - **Attachments**: Keep files under 25MB for best compatibility
         """)
 
@@ -163,13 +436,26 @@ def main():
                     help="Upload your file with contact data. We'll help you map the columns.",
                     key="file_uploader"
                 )
+                stream_mode = st.checkbox(
+                    "Stream large file",
+                    help="Keep only a preview in memory and read the file in chunks while sending. Recommended for lists with millions of rows.",
+                    key="stream_mode"
+                )
 
                 if uploaded_file:
-                    # Load the data
-                    df, message = load_data_from_file(uploaded_file)
+                    # Only the header and first rows are parsed until the
+                    # columns are mapped; then just the mapped columns are
+                    # loaded in full, from the columnar cache when possible
+                    df, message = preview_data_from_file_cached(
+                        uploaded_file, PREVIEW_ROWS)
+                    digest = upload_digest(uploaded_file)
+                    if stream_mode:
+                        digest += ':preview'
                     if df is not None:
-                        st.success(message)
+                        if stream_mode:
+                            st.success(message)
                         st.session_state.original_df = df
+                        st.session_state.stream_source = uploaded_file if stream_mode else None
 
                         # Check if we have the required columns
                         required_columns = ['first_name', 'email']
@@ -177,12 +463,24 @@ def main():
                             df, required_columns)
 
                         if not missing_columns:
-                            # If we have the required columns, use directly
-                            st.session_state.df = df
+                            # If we have the required columns, use directly;
+                            # any other column may be a template placeholder
+                            if stream_mode:
+                                st.session_state.df = df
+                            else:
+                                full_df, message = load_columns_cached(
+                                    uploaded_file, None, digest)
+                                if full_df is None:
+                                    st.error(message)
+                                    st.stop()
+                                st.success(message)
+                                st.session_state.df = full_df
                             st.session_state.column_mapping = {
                                 'first_name': 'first_name',
                                 'email': 'email'
                             }
+                            st.session_state.data_key = (
+                                digest, mapping_key(st.session_state.column_mapping))
                         else:
                             # Show column mapping interface
                             st.warning(
@@ -190,6 +488,9 @@ def main():
 
                             st.markdown("---")
                             st.subheader("Column Mapping")
+                            if not stream_mode:
+                                st.caption(
+                                    f"Read the header and first {len(df)} rows; only the columns you map are loaded in full.")
 
                             available_columns = df.columns.tolist()
 
@@ -224,22 +525,62 @@ def main():
                                     key="email_mapping"
                                 )
 
+                            # Optional fields available as template variables
+                            with st.expander("Optional fields", expanded=False):
+                                last_name_col = st.selectbox(
+                                    "Select column for Last Name:",
+                                    options=[""] + available_columns,
+                                    help="Pick the same full-name column as First Name to use its last word",
+                                    key="last_name_mapping"
+                                )
+                                company_col = st.selectbox(
+                                    "Select column for Company:",
+                                    options=[""] + available_columns,
+                                    key="company_mapping"
+                                )
+                                custom_cols = st.multiselect(
+                                    "Extra columns for templates:",
+                                    options=available_columns,
+                                    help="Each column becomes a variable, e.g. 'Job Title' → {job_title}",
+                                    key="custom_mapping"
+                                )
+
                             # Apply mapping when both columns are selected
                             if first_name_col and email_col:
                                 mapping = {
                                     'first_name': first_name_col,
                                     'email': email_col
                                 }
+                                if last_name_col:
+                                    mapping['last_name'] = last_name_col
+                                if company_col:
+                                    mapping['company'] = company_col
+                                for column in custom_cols:
+                                    mapping.setdefault(
+                                        template_field_name(column), column)
                                 st.session_state.column_mapping = mapping
-                                st.session_state.df = apply_column_mapping(
-                                    df, mapping)
+                                if stream_mode:
+                                    source_df = df
+                                else:
+                                    source_df, message = load_columns_cached(
+                                        uploaded_file, sorted(set(mapping.values())), digest)
+                                    if source_df is None:
+                                        st.error(message)
+                                        st.stop()
+                                    st.caption(f"📂 {message}")
+                                st.session_state.df = apply_column_mapping_cached(
+                                    source_df, mapping, digest)
+                                st.session_state.data_key = (
+                                    digest, mapping_key(mapping))
+                                if needs_name_extraction(first_name_col):
+                                    st.info(
+                                        f"🔧 Extracting first names from '{first_name_col}' column")
                                 st.success("✅ Column mapping applied!")
 
                                 # Show mapping summary
                                 st.info(f"**Mapping Summary:**")
-                                st.write(
-                                    f"- First Name: `{first_name_col}` → `first_name`")
-                                st.write(f"- Email: `{email_col}` → `email`")
+                                for field, column in mapping.items():
+                                    st.write(f"- `{column}` → `{{{field}}}`")
                             else:
                                 st.info(
                                     "👆 Please select both column mappings to continue")
@@ -251,10 +592,12 @@ def main():
                     df = load_sample_data()
                     st.session_state.original_df = df
                     st.session_state.df = df
+                    st.session_state.stream_source = None
                     st.session_state.column_mapping = {
                         'first_name': 'first_name',
                         'email': 'email'
                     }
+                    st.session_state.data_key = None
                     st.success("Sample data loaded successfully!")
 
         with col2:
@@ -267,14 +610,60 @@ def main():
                 st.dataframe(preview_df, use_container_width=True, height=300)
 
                 st.subheader("Data Validation")
-                errors = validate_dataframe(st.session_state.df)
+                data_key = st.session_state.get('data_key')
+                if data_key is not None:
+                    report = validate_contacts_cached(
+                        st.session_state.df, data_key)
+                else:
+                    report = validate_contacts(st.session_state.df)
+                errors = validate_dataframe(st.session_state.df, report)
                 if errors:
                     for error in errors:
                         st.error(error)
                 else:
                     st.success("✅ Data validation passed!")
 
-                st.info(f"📊 Total contacts: {len(st.session_state.df)}")
+                # Sendable but worth a look
+                for status in (STATUS_DUPLICATE, STATUS_ROLE_ACCOUNT, STATUS_MISSING_NAME):
+                    count = report.counts[STATUS_LABELS[status]]
+                    if count:
+                        st.warning(
+                            f"{STATUS_LABELS[status]}: {count:,} row(s)")
+
+                if report.problem_count:
+                    problem_labels = [label for code, label in STATUS_LABELS.items()
+                                      if code != STATUS_OK and report.counts[label]]
+                    problem_filter = st.selectbox(
+                        "Show rows with problem:",
+                        [""] + problem_labels,
+                        format_func=lambda label: label and f"{label} ({report.counts[label]:,})",
+                        key="problem_filter"
+                    )
+                    if problem_filter:
+                        status = next(code for code, label in STATUS_LABELS.items()
+                                      if label == problem_filter)
+                        st.dataframe(report.rows(st.session_state.df, status)[
+                            ['first_name', 'email']], use_container_width=True, height=200)
+
+                stream_source = st.session_state.get('stream_source')
+                if stream_source is not None:
+                    # Count once per upload, showing the running total while scanning
+                    if st.session_state.get('stream_rows_for') != stream_source.file_id:
+                        count_text = st.empty()
+                        st.session_state.stream_rows = count_data_rows(
+                            stream_source,
+                            lambda rows: count_text.text(f"Counting rows... {rows:,}"))
+                        st.session_state.stream_rows_for = stream_source.file_id
+                        count_text.empty()
+                    st.caption(
+                        f"Preview and validation cover the first {len(st.session_state.df)} rows; the rest is read while sending.")
+                    st.info(
+                        f"📊 Total contacts: {st.session_state.stream_rows:,} (streamed from file)")
+                else:
+                    st.info(f"📊 Total contacts: {len(st.session_state.df)}")
+                    st.caption(
+                        f"💾 Loaded list: {format_bytes(frame_nbytes(st.session_state.df))} in memory "
+                        "(repeated text as categories, the rest as Arrow strings)")
 
                 # Show original vs mapped columns if mapping was applied
                 if 'column_mapping' in st.session_state and 'original_df' in st.session_state:
@@ -315,8 +704,13 @@ def main():
                     total_size = sum(file.size for file in uploaded_files)
                     for file in uploaded_files:
                         st.write(f"• {file.name} ({file.size / 1024:.1f} KB)")
+                    # Encoded once here and shared by every outgoing email
+                    encoded_size = sum(
+                        item.encoded_size for item in encode_attachments(uploaded_files))
                     st.write(
-                        f"**Total size:** {total_size / 1024 / 1024:.2f} MB")
+                        f"**Total size:** {total_size / 1024 / 1024:.2f} MB "
+                        f"(encoded once: {encoded_size / 1024 / 1024:.2f} MB, "
+                        f"attachment cache: {attachment_cache_size() / 1024 / 1024:.2f} MB)")
                     st.markdown('</div>', unsafe_allow_html=True)
 
                     # Warning for large attachments
@@ -340,6 +734,7 @@ def main():
                     **Available variables:**
                     - `{first_name}` - Recipient's first name
                     - `{email}` - Recipient's email address
+                    - `{last_name}`, `{company}` and any extra columns picked in the column mapping
                     
                     **Pro Tip:** Use empty lines between paragraphs for better readability!
                     """)
@@ -380,10 +775,8 @@ Best regards,
                 if st.button("Generate Preview", key="generate_preview"):
                     if 'df' in st.session_state and not st.session_state.df.empty:
                         sample_contact = st.session_state.df.iloc[0]
-                        preview_body = email_template.format(
-                            first_name=sample_contact['first_name'],
-                            email=sample_contact['email']
-                        )
+                        preview_body = fill_placeholders(
+                            email_template, sample_contact.to_dict())
 
                         if preview_option == "Formatted":
                             st.markdown("**Formatted Preview:**")
@@ -428,87 +821,324 @@ Best regards,
         elif not all(key in smtp_config for key in ['sender_email', 'password']):
             st.warning("⚠️ Please configure SMTP settings in the sidebar.")
         else:
+            stream_source = st.session_state.get('stream_source')
+            contact_count = st.session_state.stream_rows if stream_source is not None else len(
+                st.session_state.df)
+
+            # Unsubscribes / bounces that must never be mailed
+            suppression_file = st.file_uploader(
+                "Suppression list (optional)",
+                type=['csv', 'txt', 'xlsx'],
+                help="Addresses in this file (an 'email' column or one address per line) are skipped",
+                key="suppression_uploader"
+            )
+            suppression = None
+            if suppression_file:
+                if st.session_state.get('suppression_for') != suppression_file.file_id:
+                    st.session_state.suppression = load_suppression_list(
+                        suppression_file)
+                    st.session_state.suppression_for = suppression_file.file_id
+                suppression = st.session_state.suppression
+                st.caption(
+                    f"🚫 {len(suppression):,} suppressed addresses loaded ({type(suppression).__name__}, {suppression.nbytes / 1024:.0f} KB)")
+
+            # Fields the template needs besides the email address
+            plan_fields = ['first_name'] + [
+                field for field in template_fields(email_template)
+                if field not in ('first_name', 'email')]
+
+            send_plan = None
+            if stream_source is None:
+                # Compiled once per data / template fields / suppression
+                # combination; data_key (upload digest and mapping) is None
+                # only for the built-in sample list
+                plan_key = (st.session_state.get('data_key'), tuple(plan_fields),
+                            suppression_file.file_id if suppression_file else None)
+                if st.session_state.get('send_plan_for') != plan_key:
+                    st.session_state.send_plan = compile_send_plan(
+                        st.session_state.df, plan_fields, suppression)
+                    st.session_state.send_plan_for = plan_key
+                send_plan = st.session_state.send_plan
+                contact_count = len(send_plan)
+
             # Summary of sending operation
             st.info(
-                f"📧 Ready to send emails to {len(st.session_state.df)} contacts")
+                f"📧 Ready to send emails to {contact_count:,} contacts")
+            if send_plan is not None:
+                st.caption(
+                    f"💾 Send plan: a {format_bytes(send_plan.nbytes)} row index over the "
+                    f"{format_bytes(send_plan.fields_nbytes)} of columns the template uses, shared with the loaded list")
+            if send_plan is not None and send_plan.removed_count:
+                st.info("🧹 Removed before sending: " + ", ".join(
+                    f"{count:,} {reason}" for reason, count in send_plan.removed.items() if count))
             if uploaded_files:
                 st.info(
                     f"📎 {len(uploaded_files)} file(s) will be attached to each email")
+            quota_left = SenderPool(sender_configs, ledger=st.session_state.quota_ledger).allowance()
+            if quota_left is not None and quota_left < contact_count:
+                st.info(
+                    f"📅 The sender accounts have {quota_left:,} emails of quota left. The other "
+                    f"{contact_count - quota_left:,} are sent as their daily and hourly windows free up; "
+                    "the campaign keeps running until then.")
 
             # Send configuration
             st.subheader("Send Configuration")
-            send_delay = st.slider(
-                "Delay between emails (seconds)",
-                min_value=0.0,
-                max_value=5.0,
-                value=0.5,
-                help="Add delay to avoid being flagged as spam",
-                key="send_delay"
+            send_engine = st.radio(
+                "Delivery engine",
+                ["Threads", "Asyncio (pipelining)"],
+                horizontal=True,
+                help="Asyncio holds many more concurrent SMTP conversations in one thread and pipelines commands when the server supports it",
+                key="send_engine"
+            )
+            adaptive_rate = st.checkbox(
+                "Adaptive rate",
+                value=False,
+                help="Start slowly and speed up while the server accepts mail; back off when it answers 421/450/451/452. Max rate becomes the ceiling.",
+                key="adaptive_rate"
+            )
+            rate_col, unit_col, concurrency_col = st.columns(3)
+            with rate_col:
+                max_rate = st.number_input(
+                    "Max rate",
+                    min_value=0.0,
+                    value=2.0,
+                    help="Ceiling on emails sent across all connections (0 = unlimited)",
+                    key="max_rate"
+                )
+            with unit_col:
+                rate_unit = st.selectbox(
+                    "Rate unit", ["per second", "per minute"], key="rate_unit")
+            with concurrency_col:
+                max_concurrency = st.number_input(
+                    "Max concurrency",
+                    min_value=1,
+                    max_value=20 if send_engine == "Threads" else 500,
+                    value=1,
+                    help="Number of parallel SMTP connections",
+                    key="max_concurrency"
+                )
+            max_retries = st.number_input(
+                "Retries for temporary failures",
+                min_value=0,
+                max_value=10,
+                value=3,
+                help="Deferrals (4xx) and dropped connections are retried with growing, randomized delays; permanent rejections (5xx) never are",
+                key="max_retries"
             )
 
-            # Send emails button
-            if st.button("🚀 Send All Emails", type="primary", key="send_emails"):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                results = []
-
-                for i, (index, row) in enumerate(st.session_state.df.iterrows()):
-                    status_text.text(
-                        f"Sending email {i+1} of {len(st.session_state.df)} to {row['first_name']}...")
-
-                    # Send email with attachments
-                    success, message = send_single_email(
-                        row['first_name'],
-                        row['email'],
-                        email_subject,
-                        email_template,
-                        smtp_config,
-                        attachments=uploaded_files if uploaded_files else None,
-                        format_type='markdown'
+            # Recipients are interleaved across receiving domains; these cap each one
+            with st.expander("Per-domain limits"):
+                domain_concurrency_col, domain_rate_col = st.columns(2)
+                with domain_concurrency_col:
+                    per_domain_concurrency = st.number_input(
+                        "Max concurrency per domain",
+                        min_value=0,
+                        value=0,
+                        help="Messages in flight to any one receiving domain (0 = unlimited)",
+                        key="per_domain_concurrency"
                     )
+                with domain_rate_col:
+                    per_domain_rate = st.number_input(
+                        f"Max rate per domain ({rate_unit})",
+                        min_value=0.0,
+                        value=0.0,
+                        help="Ceiling on emails to any one receiving domain (0 = unlimited)",
+                        key="per_domain_rate"
+                    )
+                resolve_mx = st.checkbox(
+                    "Group domains by mail provider (MX lookup)",
+                    value=False,
+                    disabled=not HAS_DNS,
+                    help="Domains hosted by the same provider (e.g. Google Workspace) share the limits above"
+                    + ("" if HAS_DNS else ". Requires the dnspython package."),
+                    key="resolve_mx"
+                )
+            if resolve_mx and 'mx_resolver' not in st.session_state:
+                # Cached lookups are kept for the whole browser session
+                st.session_state.mx_resolver = MXResolver()
+
+            with st.expander("Diagnostics"):
+                profile_campaign = st.checkbox(
+                    "Profile this campaign (cProfile)",
+                    value=False,
+                    help="Record where Python time goes in every sending thread. Slows sending down.",
+                    key="profile_campaign"
+                )
+                trace_memory = st.checkbox(
+                    "Trace memory allocations (tracemalloc)",
+                    value=False,
+                    help="Report the lines that allocated the most memory. Slows sending down considerably.",
+                    key="trace_memory"
+                )
 
-                    results.append({
-                        'name': row['first_name'],
-                        'email': row['email'],
-                        'success': success,
-                        'message': message
-                    })
-
-                    # Update progress
-                    progress_bar.progress((i + 1) / len(st.session_state.df))
-
-                    # Add delay between emails
-                    if send_delay > 0:
-                        time.sleep(send_delay)
-
-                # Display results
-                st.subheader("📊 Sending Results")
-                success_count = sum(1 for r in results if r['success'])
-                failure_count = len(results) - success_count
-
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Emails Sent Successfully",
-                              f"{success_count}/{len(results)}")
-                with col2:
-                    st.metric("Failed Attempts", failure_count)
-
-                # Detailed results
-                with st.expander("View Detailed Results"):
-                    for result in results:
-                        if result['success']:
-                            st.success(result['message'])
-                        else:
-                            st.error(result['message'])
+            delivery_mode = st.radio(
+                "Run campaign",
+                ["Background worker", "In this browser session"],
+                horizontal=True,
+                help="The background worker keeps sending if you close or reload this page; run it with `python worker.py`",
+                key="delivery_mode"
+            )
 
-                # Summary
-                if failure_count == 0:
-                    st.balloons()
-                    st.success(
-                        f"🎉 All {success_count} emails sent successfully!")
+            queue_clicked = send_clicked = resume_clicked = False
+            if delivery_mode == "Background worker":
+                campaign_name = st.text_input(
+                    "Campaign name", value=email_subject, key="campaign_name")
+                queue_clicked = st.button(
+                    "📥 Queue Campaign", type="primary", key="queue_campaign")
+            else:
+                # Outcomes of earlier runs of this exact campaign (same data, subject and template)
+                campaign_key = campaign_id(
+                    email_subject, email_template, st.session_state.get('data_key'))
+                journal = journal_summary(campaign_key)
+                if journal and (journal['delivered'] or journal['rejected']):
+                    st.info(
+                        f"⏯️ An earlier run of this campaign delivered {journal['delivered']:,} emails "
+                        f"({journal['rejected']:,} rejected, {journal['failed']:,} failed temporarily). "
+                        "Resume to send only to the rest.")
+                    resume_clicked = st.button(
+                        "⏯️ Resume Campaign", key="resume_campaign")
+                send_clicked = st.button(
+                    "🚀 Send All Emails", type="primary", key="send_emails")
+
+            # Skip addresses the journal shows as delivered or permanently rejected
+            delivered = finished_addresses(campaign_key) if resume_clicked else None
+            stream_stats = {}
+            stream_removed = {}
+            if stream_source is not None:
+                # Rows are read, mapped, validated and deduplicated chunk by chunk while sending
+                recipients = iter_planned_recipients(
+                    iter_contact_chunks(
+                        stream_source, st.session_state.column_mapping, stats=stream_stats),
+                    suppression, stream_removed, delivered)
+            elif delivered is not None:
+                recipients = send_plan.without(delivered)
+                contact_count = len(recipients)
+                st.info(
+                    f"⏭️ Skipping {recipients.removed['delivered']:,} addresses delivered or rejected in an earlier run")
+            else:
+                recipients = send_plan
+
+            if delivery_mode == "Background worker":
+                if queue_clicked:
+                    with st.spinner("Queuing recipients..."):
+                        job_id = submit_job(
+                            recipients,
+                            email_subject,
+                            email_template,
+                            smtp_config,
+                            attachments=uploaded_files if uploaded_files else None,
+                            options={
+                                'engine': 'threads' if send_engine == "Threads" else 'asyncio',
+                                'format_type': 'markdown',
+                                'max_rate': rate_per_second(max_rate, rate_unit),
+                                'max_concurrency': int(max_concurrency),
+                                'per_domain_concurrency': int(per_domain_concurrency) or None,
+                                'per_domain_rate': rate_per_second(per_domain_rate, rate_unit),
+                                'resolve_mx': resolve_mx,
+                                'adaptive_rate': adaptive_rate,
+                                'max_attempts': int(max_retries) + 1,
+                                'profile': profile_campaign,
+                                'trace_memory': trace_memory,
+                                'senders': sender_configs,
+                            },
+                            name=campaign_name
+                        )
+                    st.success(f"📥 Campaign #{job_id} queued")
+
+                st.subheader("📋 Queued Campaigns")
+                job_monitor()
+
+            elif send_clicked or resume_clicked:
+                live = st.session_state.get('live_campaign')
+                if live is not None and live.running:
+                    st.warning("⚠️ A campaign is already sending from this page; stop it or wait for it to finish.")
+                    send_clicked = resume_clicked = False
                 else:
-                    st.warning(
-                        f"✅ {success_count} emails sent, ❌ {failure_count} failed")
+                    if send_clicked:
+                        # A fresh send starts a new journal
+                        reset_journal(campaign_key)
+                    elif stream_source is not None:
+                        contact_count -= journal['delivered'] + journal['rejected']
+                    metrics = DeliveryMetrics()
+                    if profile_campaign or trace_memory:
+                        metrics.start_capture(profile_campaign, trace_memory)
+
+                    # Sending runs in a background thread; the dashboard fragment polls it
+                    campaign = iter_campaign if send_engine == "Threads" else iter_campaign_async
+                    senders = SenderPool(sender_configs, ledger=st.session_state.quota_ledger)
+                    st.session_state.live_campaign = LiveCampaign(
+                        campaign(
+                            recipients,
+                            email_subject,
+                            email_template,
+                            smtp_config,
+                            attachments=uploaded_files if uploaded_files else None,
+                            format_type='markdown',
+                            max_rate=rate_per_second(max_rate, rate_unit),
+                            max_concurrency=int(max_concurrency),
+                            per_domain_concurrency=int(per_domain_concurrency) or None,
+                            per_domain_rate=rate_per_second(per_domain_rate, rate_unit),
+                            resolver=st.session_state.mx_resolver if resolve_mx else None,
+                            adaptive_rate=adaptive_rate,
+                            max_attempts=int(max_retries) + 1,
+                            metrics=metrics,
+                            senders=senders
+                        ),
+                        contact_count,
+                        campaign_key,
+                        metrics=metrics,
+                        metrics_file=METRICS_FILE,
+                        senders=senders
+                    ).start()
+                    st.session_state.live_campaign_stream = (stream_stats, stream_removed)
+                    st.session_state.live_campaign_reported = False
+                    st.session_state.pop('results_exports', None)
+                    st.session_state.pop('results_page', None)
+
+            live = st.session_state.get('live_campaign')
+            if delivery_mode == "In this browser session" and live is not None:
+                if live.running:
+                    st.subheader("📡 Live Campaign")
+                    campaign_dashboard()
+                else:
+                    if live.error:
+                        st.error(f"❌ Campaign stopped by an error: {live.error}")
+                    stream_stats, stream_removed = st.session_state.live_campaign_stream
+                    if stream_stats.get('skipped'):
+                        st.info(
+                            f"⏭️ {stream_stats['skipped']:,} rows skipped for missing or invalid email")
+                    if any(stream_removed.values()):
+                        st.info("🧹 Removed while streaming: " + ", ".join(
+                            f"{count:,} {reason}" for reason, count in stream_removed.items() if count))
+                    if live.senders is not None:
+                        with st.expander("👥 Sender accounts"):
+                            show_sender_accounts(live.senders.summary())
+                    if live.metrics is not None:
+                        with st.expander("⏱️ Delivery metrics"):
+                            show_delivery_metrics(live.metrics.snapshot())
+                    if live.capture_files:
+                        with st.expander("🔬 Profile report"):
+                            st.code(live.metrics.capture_report(), language=None)
+                            for path in live.capture_files:
+                                with open(path, 'rb') as f:
+                                    st.download_button(f"Download {os.path.basename(path)}", f.read(),
+                                                       file_name=os.path.basename(path), key=f"download_{path}",
+                                                       on_click="ignore")
+
+                    show_campaign_results(live.store)
+
+                    # Summary, once per campaign
+                    if not st.session_state.live_campaign_reported:
+                        st.session_state.live_campaign_reported = True
+                        counts = live.store.counts()
+                        failure_count = counts['failed'] + counts['rejected']
+                        if failure_count == 0:
+                            st.balloons()
+                            st.success(
+                                f"🎉 All {counts['sent']} emails sent successfully!")
+                        else:
+                            st.warning(
+                                f"✅ {counts['sent']} emails sent, ❌ {failure_count} failed")
 
 
 footer = """
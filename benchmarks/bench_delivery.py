@@ -0,0 +1,182 @@
+"""
+Delivery throughput benchmarks against a local SMTP sink.
+
+Each scenario sends a synthetic recipient list through one code path
+(sequential send_single_email over a reused SMTPSession, the threaded
+campaign engine or the asyncio engine) in a fresh process and reports
+messages/sec, p50/p99 per-message latency, CPU time and peak RSS as one
+JSON line per scenario:
+
+    python -m benchmarks.bench_delivery                          # 1k/10k/100k, all engines
+    python -m benchmarks.bench_delivery --sizes 1000 --engines asyncio --tls
+    python -m benchmarks.bench_delivery --latency 0.01 --fail-rate 0.02 --output results.jsonl
+"""
+import argparse
+import functools
+import time
+from contextlib import contextmanager
+
+import utils.async_sender as async_sender
+import utils.send_engine as send_engine
+from benchmarks.common import cpu_seconds, peak_rss_mb, percentile_ms, environment, run_isolated, emit
+from benchmarks.smtp_sink import SinkProcess
+from utils.email_sender import send_single_email, SMTPSession, MessageSkeleton
+from utils.job_queue import StoredAttachment
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_ENGINES = ('single', 'threads', 'asyncio')
+DEFAULT_CONCURRENCY = {'single': 1, 'threads': 10, 'asyncio': 100}
+
+SUBJECT = "Benchmark {first_name}"
+BODY = """Hi **{first_name}**,
+
+This is a *benchmark* message for {email} from {company}.
+
+- one
+- two
+
+[Unsubscribe](https://example.com/unsubscribe)
+"""
+
+
+def synthetic_recipients(count, domains=50):
+    for i in range(count):
+        yield {'first_name': f"User{i}", 'email': f"user{i}@example{i % domains}.com",
+               'company': f"Company {i % 997}"}
+
+
+def synthetic_attachment(size):
+    # Incompressible-looking bytes, like a real PDF or image
+    data = bytes((i * 7919 + (i >> 8)) & 0xFF for i in range(size))
+    return StoredAttachment('benchmark.pdf', data)
+
+
+@contextmanager
+def timed_deliveries(samples):
+    """
+    Record the wall time of every deliver_email / deliver_email_async call
+    the engines make
+    """
+    deliver, deliver_async = send_engine.deliver_email, async_sender.deliver_email_async
+
+    @functools.wraps(deliver)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return deliver(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    @functools.wraps(deliver_async)
+    async def timed_async(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await deliver_async(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    send_engine.deliver_email, async_sender.deliver_email_async = timed, timed_async
+    try:
+        yield
+    finally:
+        send_engine.deliver_email, async_sender.deliver_email_async = deliver, deliver_async
+
+
+def run_scenario(engine, count, attachment_bytes, concurrency, smtp_config):
+    """
+    One benchmark run; executed in its own process by run_isolated
+    """
+    attachments = [synthetic_attachment(attachment_bytes)] if attachment_bytes else None
+    recipients = synthetic_recipients(count)
+    samples = []
+    sent = failed = 0
+
+    cpu_start = cpu_seconds()
+    start = time.perf_counter()
+    if engine == 'single':
+        # The Send tab's original loop, with connection and skeleton reuse
+        skeleton = MessageSkeleton(SUBJECT, smtp_config, attachments)
+        with SMTPSession(smtp_config) as session:
+            for recipient in recipients:
+                began = time.perf_counter()
+                success, _ = send_single_email(
+                    recipient['first_name'], recipient['email'], SUBJECT, BODY, smtp_config,
+                    attachments=attachments, session=session, skeleton=skeleton, fields=recipient)
+                samples.append(time.perf_counter() - began)
+                sent += success
+                failed += not success
+    else:
+        campaign = send_engine.iter_campaign if engine == 'threads' else async_sender.iter_campaign_async
+        with timed_deliveries(samples):
+            for _, result in campaign(recipients, SUBJECT, BODY, smtp_config, attachments=attachments,
+                                      max_concurrency=concurrency, max_attempts=1):
+                sent += result['success']
+                failed += not result['success']
+    elapsed = time.perf_counter() - start
+
+    return {
+        'sent': sent,
+        'failed': failed,
+        'elapsed_s': round(elapsed, 3),
+        'msgs_per_sec': round((sent + failed) / elapsed, 1) if elapsed else None,
+        'p50_ms': percentile_ms(samples, 50),
+        'p99_ms': percentile_ms(samples, 99),
+        'cpu_s': round(cpu_seconds() - cpu_start, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="Recipient list sizes (default: %(default)s)")
+    parser.add_argument('--engines', nargs='+', choices=DEFAULT_ENGINES, default=list(DEFAULT_ENGINES))
+    parser.add_argument('--attachment-kb', type=int, nargs='+', default=[0, 100],
+                        help="Attachment sizes to run, 0 for none (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int,
+                        help="Connections for the campaign engines (default: 10 threads, 100 asyncio)")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Sink delay in seconds before each end-of-DATA reply")
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help="Fraction of recipients the sink rejects")
+    parser.add_argument('--fail-reply', default='550 5.1.1 User unknown')
+    parser.add_argument('--tls', action='store_true',
+                        help="Use STARTTLS with a self-signed certificate")
+    parser.add_argument('--output', help="Append JSON lines here instead of stdout")
+    args = parser.parse_args()
+
+    env = environment()
+    with SinkProcess(latency=args.latency, fail_rate=args.fail_rate,
+                     fail_reply=args.fail_reply, tls=args.tls) as sink:
+        smtp_config = {
+            'host': '127.0.0.1',
+            'port': sink.port,
+            'starttls': args.tls,
+            'sender_email': 'bench@example.com',
+            'sender_name': 'Benchmark',
+            'password': 'benchmark',
+        }
+        for count in args.sizes:
+            for attachment_kb in args.attachment_kb:
+                for engine in args.engines:
+                    concurrency = args.concurrency or DEFAULT_CONCURRENCY[engine]
+                    if engine == 'single':
+                        concurrency = 1
+                    record = {
+                        'benchmark': 'delivery',
+                        'engine': engine,
+                        'recipients': count,
+                        'attachment_kb': attachment_kb,
+                        'concurrency': concurrency,
+                        'tls': args.tls,
+                        'latency_ms': args.latency * 1000,
+                        'fail_rate': args.fail_rate,
+                    }
+                    record.update(run_isolated(run_scenario, engine, count, attachment_kb * 1024,
+                                               concurrency, smtp_config))
+                    record.update(env)
+                    emit(record, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Ingestion and validation scaling benchmarks for utils/data_loader.
+
+Generates synthetic contact files with realistic dirty data (full names
+with stray whitespace and titles, malformed and blank emails, case-only
+duplicates, role accounts) and times every data-prep stage the Upload tab
+runs, one JSON line per stage with wall time, rows/sec and peak memory:
+
+    python -m benchmarks.bench_ingest                                   # CSV and xlsx, 10k to 5M rows
+    python -m benchmarks.bench_ingest --formats csv --sizes 10000 100000
+    python -m benchmarks.bench_ingest --stages load_data_from_file validate_contacts
+
+Generated files are kept in --data-dir and reused by later runs. Each file
+is benchmarked in a fresh process so memory figures do not leak between
+sizes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import MemorySampler, current_rss_mb, environment, run_isolated, emit
+from utils.data_loader import (load_data_from_file, validate_dataframe, validate_dataframe_with_mapping,
+                               validate_contacts, apply_column_mapping, extract_first_name,
+                               extract_first_names, iter_contact_chunks)
+
+DEFAULT_SIZES = (10000, 100000, 1000000, 5000000)
+DEFAULT_FORMATS = ('csv', 'xlsx')
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'email-automation-bench')
+
+# Worksheet limit: 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1048575
+
+MAPPING = {'first_name': 'Full Name', 'email': 'Email Address', 'company': 'Company'}
+
+FIRST_NAMES = ['James', 'Mary', 'Oluwafemi', 'Aisha', 'Wei', 'Sofia', 'Mohammed', 'Priya',
+               'Liam', 'Chloé', 'Kwame', 'Yuki', 'Ana', 'José', 'Olga', 'Fatima']
+LAST_NAMES = ['Smith', 'Adejumobi', 'Okafor', 'Chen', 'García', 'Müller', 'Khan', 'Patel',
+              "O'Brien", 'Nakamura', 'Silva', 'Ivanova', 'Mensah', 'Rossi', 'Kowalski', 'Dubois']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com', 'icloud.com',
+           'dftlabs.com', 'example.org', 'company.co.uk', 'mail.ru', 'proton.me']
+BAD_EMAILS = ['not-an-email', 'missing@tld', '@nouser.com', 'two@@at.com', 'spaces in@mail.com',
+              'trailing.dot@mail.com.', 'N/A', '-', 'user@', 'user.mail.com']
+
+
+class BenchmarkUpload(BytesIO):
+    """
+    In-memory file with the parts of Streamlit's UploadedFile the loaders
+    use; like the real thing, the whole upload is held in memory
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.file_id = f"bench-{self.name}"
+        self.size = len(self.getbuffer())
+
+
+def make_contacts(rows, seed=0):
+    """
+    Synthetic contact list with the kinds of mess real uploads have:
+    ~2% blank names, ~5% padded or lower-cased names, ~4% malformed and
+    ~2% blank emails, ~3% duplicates differing only in case, ~1% role
+    accounts
+    """
+    rng = np.random.default_rng(seed)
+    first = pd.Series(np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), rows)])
+    last = pd.Series(np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), rows)])
+    domain = pd.Series(np.array(DOMAINS, dtype=object)[rng.integers(0, len(DOMAINS), rows)])
+    ids = pd.Series(np.arange(rows)).astype(str)
+
+    full_name = first + ' ' + last
+    roll = rng.random(rows)
+    full_name = full_name.where(roll >= 0.03, '  ' + full_name + ' ')
+    full_name = full_name.where((roll < 0.03) | (roll >= 0.05), 'dr. ' + full_name.str.lower())
+    full_name = full_name.where(rng.random(rows) >= 0.02, None)
+
+    email = (first.str.lower().str.replace('é', 'e') + '.' + last.str.lower().str.replace(
+        r"[^a-z]", '', regex=True) + ids + '@' + domain)
+    roll = rng.random(rows)
+    bad = pd.Series(np.array(BAD_EMAILS, dtype=object)[rng.integers(0, len(BAD_EMAILS), rows)])
+    email = email.where(roll >= 0.04, bad)
+    email = email.where((roll < 0.04) | (roll >= 0.06), None)
+    email = email.where((roll < 0.06) | (roll >= 0.07), 'info@' + domain)
+    # Case-only repeats of an earlier row's address
+    duplicate = np.flatnonzero((roll >= 0.07) & (roll < 0.10))
+    duplicate = duplicate[duplicate > 0]
+    source = (rng.random(len(duplicate)) * duplicate).astype(np.int64)
+    email.iloc[duplicate] = email.iloc[source].str.upper().to_numpy()
+
+    return pd.DataFrame({
+        'Full Name': full_name,
+        'Email Address': email,
+        'Company': 'Company ' + pd.Series(rng.integers(0, 5000, rows)).astype(str),
+        'City': np.array(['Lagos', 'London', 'New York', 'São Paulo', 'Mumbai'],
+                         dtype=object)[rng.integers(0, 5, rows)],
+        'Signup Date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1800, rows), unit='D'),
+        'Notes': np.where(rng.random(rows) < 0.3, 'Met at conference, follow up in Q3', ''),
+    })
+
+
+def contact_file(data_dir, fmt, rows):
+    """
+    Path of a generated contact file, creating it on first use
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"contacts_{rows}.{fmt}")
+    if not os.path.exists(path):
+        df = make_contacts(rows)
+        partial = os.path.join(data_dir, f"contacts_{rows}.partial.{fmt}")
+        if fmt == 'csv':
+            df.to_csv(partial, index=False)
+        else:
+            df.to_excel(partial, index=False, engine='openpyxl')
+        os.replace(partial, path)
+    return path
+
+
+def _stages(upload, frames):
+    """
+    (name, callable) for every stage, in Upload tab order; callables store
+    what later stages need in `frames`
+    """
+    def load():
+        df, message = load_data_from_file(upload)
+        if df is None:
+            raise RuntimeError(message)
+        frames['raw'] = df
+
+    def mapped():
+        frames['mapped'] = apply_column_mapping(frames['raw'], MAPPING)
+
+    def streaming():
+        stats = {}
+        for _ in iter_contact_chunks(upload, MAPPING, stats=stats):
+            pass
+
+    return [
+        ('load_data_from_file', load),
+        ('validate_dataframe_with_mapping', lambda: validate_dataframe_with_mapping(frames['raw'], MAPPING)),
+        ('apply_column_mapping', mapped),
+        ('validate_dataframe', lambda: validate_dataframe(frames['mapped'])),
+        ('validate_contacts', lambda: validate_contacts(frames['mapped'])),
+        ('extract_first_name', lambda: frames['raw']['Full Name'].map(extract_first_name)),
+        ('extract_first_names', lambda: extract_first_names(frames['raw']['Full Name'])),
+        ('iter_contact_chunks', streaming),
+    ]
+
+
+STAGE_NAMES = [name for name, _ in _stages(None, {})]
+
+# Stages whose output a later stage works on
+REQUIRES = {
+    'validate_dataframe_with_mapping': 'load_data_from_file',
+    'apply_column_mapping': 'load_data_from_file',
+    'validate_dataframe': 'apply_column_mapping',
+    'validate_contacts': 'apply_column_mapping',
+    'extract_first_name': 'load_data_from_file',
+    'extract_first_names': 'load_data_from_file',
+}
+
+
+def _with_prerequisites(stages):
+    needed = set(stages)
+    for name in reversed(STAGE_NAMES):
+        if name in needed and name in REQUIRES:
+            needed.add(REQUIRES[name])
+    return needed
+
+
+def run_file(path, stages):
+    """
+    Time the selected stages on one file; executed in its own process by
+    run_isolated. Returns one dict per stage.
+    """
+    upload = BenchmarkUpload(path)
+    frames = {}
+    results = []
+    needed = _with_prerequisites(stages)
+    for name, stage in _stages(upload, frames):
+        if name not in needed:
+            continue
+        with MemorySampler() as memory:
+            start = time.perf_counter()
+            stage()
+            elapsed = time.perf_counter() - start
+        if name in stages:
+            results.append({
+                'stage': name,
+                'wall_s': round(elapsed, 4),
+                'peak_mb': round(memory.peak_mb, 1),
+                'growth_mb': round(memory.growth_mb, 1),
+                'rss_after_mb': round(current_rss_mb() or memory.peak_mb, 1),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="Row counts (default: %(default)s)")
+    parser.add_argument('--formats', nargs='+', choices=DEFAULT_FORMATS, default=list(DEFAULT_FORMATS))
+    parser.add_argument('--stages', nargs='+', choices=STAGE_NAMES, default=STAGE_NAMES)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help="Where generated files are kept (default: %(default)s)")
+    parser.add_argument('--output', help="Append JSON lines here instead of stdout")
+    args = parser.parse_args()
+
+    env = environment()
+    for fmt in args.formats:
+        for rows in args.sizes:
+            if fmt == 'xlsx' and rows > XLSX_MAX_ROWS:
+                print(f"Skipping xlsx with {rows:,} rows: over the worksheet limit", file=sys.stderr)
+                continue
+            path = contact_file(args.data_dir, fmt, rows)
+            for result in run_isolated(run_file, path, args.stages):
+                record = {
+                    'benchmark': 'ingest',
+                    'format': fmt,
+                    'rows': rows,
+                    'file_mb': round(os.path.getsize(path) / (1024 * 1024), 1),
+                }
+                record.update(result)
+                record['rows_per_sec'] = round(rows / result['wall_s']) if result['wall_s'] else None
+                record.update(env)
+                emit(record, args.output)
+
+
+if __name__ == "__main__":
+    main()
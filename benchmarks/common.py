@@ -0,0 +1,149 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+def cpu_seconds():
+    """
+    User + system CPU time of this process so far
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def current_rss_mb():
+    """
+    Resident set size right now in MB (Linux /proc; None elsewhere)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class MemorySampler:
+    """
+    Peak RSS over a block of code, sampled from a background thread.
+
+    ru_maxrss is a high-water mark for the whole process; sampling the
+    current RSS gives the peak of each stage on its own. `peak_mb` is the
+    highest RSS seen and `growth_mb` how far it rose above the RSS at the
+    start. Where /proc is unavailable both fall back to ru_maxrss.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self.stop = threading.Event()
+        self.thread = None
+
+    def _sample(self):
+        while not self.stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self):
+        self.start_mb = current_rss_mb()
+        if self.start_mb is None:
+            self.start_mb = self.peak_mb = peak_rss_mb()
+            return self
+        self.peak_mb = self.start_mb
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.thread is None:
+            self.peak_mb = peak_rss_mb()
+            return
+        self.stop.set()
+        self.thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    @property
+    def growth_mb(self):
+        return self.peak_mb - self.start_mb
+
+
+def percentile_ms(samples, q):
+    if not samples:
+        return None
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """
+    Fields attached to every result so runs can be compared across versions
+    """
+    return {
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def _isolated(queue, func, args):
+    try:
+        queue.put(('ok', func(*args)))
+    except BaseException as e:
+        queue.put(('error', f"{type(e).__name__}: {e}"))
+
+
+def run_isolated(func, *args):
+    """
+    Run func(*args) in a fresh process and return its result, so CPU time
+    and peak RSS measured inside it belong to that benchmark alone
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_isolated, args=(queue, func, args))
+    process.start()
+    status, value = queue.get()
+    process.join()
+    if status == 'error':
+        raise RuntimeError(value)
+    return value
+
+
+def emit(record, output=None):
+    """
+    Write one result as a JSON line (to `output` if given, else stdout)
+    and a short human summary to stderr
+    """
+    line = json.dumps(record, default=str)
+    if output:
+        with open(output, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    else:
+        print(line, flush=True)
+    summary = ', '.join(f"{key}={value}" for key, value in record.items()
+                        if key not in ('git_revision', 'python', 'platform', 'timestamp'))
+    print(summary, file=sys.stderr, flush=True)
@@ -0,0 +1,237 @@
+"""
+Local stand-in SMTP server for benchmarks.
+
+Accepts everything (AUTH included) and throws messages away. Optional
+STARTTLS with a throwaway self-signed certificate, a fixed delay before
+each end-of-DATA reply to mimic server-side queueing, and a fraction of
+recipients rejected with a chosen reply:
+
+    python -m benchmarks.smtp_sink --port 2525 --latency 0.005 --fail-rate 0.01 --tls
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import ssl
+import subprocess
+import tempfile
+
+# Largest message the sink reads in one piece
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+def make_self_signed_cert(directory):
+    """
+    Create cert.pem / key.pem for CN=localhost in `directory` with the
+    openssl command line tool; returns (cert_path, key_path)
+    """
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+async def _start_tls(reader, writer, context):
+    if hasattr(writer, 'start_tls'):
+        await writer.start_tls(context)
+        return writer
+    # Python < 3.11: upgrade the transport and rebuild the writer
+    loop = asyncio.get_running_loop()
+    protocol = writer.transport.get_protocol()
+    transport = await loop.start_tls(writer.transport, protocol, context, server_side=True)
+    return asyncio.StreamWriter(transport, protocol, reader, loop)
+
+
+class SMTPSink:
+    """
+    asyncio SMTP server that counts and discards messages.
+
+    `latency` seconds pass before each message's final 250; `fail_rate` of
+    RCPT commands get `fail_reply` (chosen with a seeded RNG so runs are
+    repeatable); `tls_context` enables STARTTLS.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0,
+                 fail_reply='550 5.1.1 User unknown', tls_context=None, seed=0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_reply = fail_reply
+        self.tls_context = tls_context
+        self.random = random.Random(seed)
+        self.server = None
+        self.stats = {'connections': 0, 'messages': 0, 'bytes': 0, 'rejected': 0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle, self.host, self.port, backlog=4096, limit=MAX_MESSAGE_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.stats['connections'] += 1
+        tls_active = False
+        recipients = 0
+
+        def reply(line):
+            writer.write(line.encode('ascii') + b'\r\n')
+
+        try:
+            reply('220 sink ESMTP ready')
+            while True:
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    return
+                command = line.decode('utf-8', 'replace').strip()
+                verb = command[:4].upper()
+                if verb in ('EHLO', 'HELO'):
+                    lines = ['sink', 'PIPELINING', '8BITMIME', 'AUTH PLAIN LOGIN']
+                    if self.tls_context is not None and not tls_active:
+                        lines.append('STARTTLS')
+                    for extension in lines[:-1]:
+                        reply(f'250-{extension}')
+                    reply(f'250 {lines[-1]}')
+                elif verb == 'STAR' and self.tls_context is not None and not tls_active:
+                    reply('220 Ready to start TLS')
+                    await writer.drain()
+                    writer = await _start_tls(reader, writer, self.tls_context)
+                    tls_active = True
+                elif verb == 'AUTH':
+                    if command.upper().startswith('AUTH LOGIN'):
+                        for prompt in ('VXNlcm5hbWU6', 'UGFzc3dvcmQ6'):
+                            reply(f'334 {prompt}')
+                            await writer.drain()
+                            await reader.readline()
+                    reply('235 Authentication successful')
+                elif verb == 'MAIL':
+                    recipients = 0
+                    reply('250 OK')
+                elif verb == 'RCPT':
+                    if self.fail_rate and self.random.random() < self.fail_rate:
+                        self.stats['rejected'] += 1
+                        reply(self.fail_reply)
+                    else:
+                        recipients += 1
+                        reply('250 OK')
+                elif verb == 'DATA' and not recipients:
+                    # As real servers do when every RCPT was refused
+                    reply('554 5.5.1 No valid recipients')
+                elif verb == 'DATA':
+                    reply('354 End data with <CR><LF>.<CR><LF>')
+                    await writer.drain()
+                    data = await reader.readline()
+                    if data != b'.\r\n':
+                        data += await reader.readuntil(b'\r\n.\r\n')
+                    size = len(data) - 3
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    self.stats['messages'] += 1
+                    self.stats['bytes'] += size
+                    reply('250 OK queued')
+                elif verb in ('RSET', 'NOOP'):
+                    recipients = 0 if verb == 'RSET' else recipients
+                    reply('250 OK')
+                elif verb == 'QUIT':
+                    reply('221 Bye')
+                    await writer.drain()
+                    return
+                else:
+                    reply('500 Command not recognized')
+        except (ConnectionError, ssl.SSLError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+
+def tls_context_for(directory):
+    cert, key = make_self_signed_cert(directory)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def _serve(options, ready, stop, results):
+    async def main():
+        with tempfile.TemporaryDirectory() as directory:
+            sink = SMTPSink(
+                port=options.get('port', 0),
+                latency=options.get('latency', 0.0),
+                fail_rate=options.get('fail_rate', 0.0),
+                fail_reply=options.get('fail_reply', '550 5.1.1 User unknown'),
+                tls_context=tls_context_for(directory) if options.get('tls') else None)
+            ready.put(await sink.start())
+            await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+            await sink.close()
+            results.put(sink.stats)
+
+    asyncio.run(main())
+
+
+class SinkProcess:
+    """
+    SMTPSink running in its own process, so its CPU time and memory stay
+    out of the client's measurements. Use as a context manager; `port` is
+    set once it is listening and `stats` after it stops.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.port = None
+        self.stats = None
+        context = multiprocessing.get_context('spawn')
+        self.ready = context.Queue()
+        self.results = context.Queue()
+        self.stop = context.Event()
+        self.process = context.Process(
+            target=_serve, args=(options, self.ready, self.stop, self.results), daemon=True)
+
+    def __enter__(self):
+        self.process.start()
+        self.port = self.ready.get(timeout=60)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop.set()
+        self.stats = self.results.get(timeout=60)
+        self.process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Seconds before each end-of-DATA reply")
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help="Fraction of recipients to reject")
+    parser.add_argument('--fail-reply', default='550 5.1.1 User unknown')
+    parser.add_argument('--tls', action='store_true', help="Offer STARTTLS")
+    args = parser.parse_args()
+
+    async def serve():
+        with tempfile.TemporaryDirectory() as directory:
+            sink = SMTPSink(port=args.port, latency=args.latency, fail_rate=args.fail_rate,
+                            fail_reply=args.fail_reply,
+                            tls_context=tls_context_for(directory) if args.tls else None)
+            print(f"SMTP sink listening on 127.0.0.1:{await sink.start()}")
+            try:
+                await asyncio.Event().wait()
+            finally:
+                print(sink.stats)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
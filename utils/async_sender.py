@@ -0,0 +1,446 @@
+import asyncio
+import base64
+import queue
+import smtplib
+import ssl
+import threading
+
+from utils.email_sender import build_email_message, compile_template, personalization, message_to_wire, prepare_data, describe_failure, DEFAULT_MESSAGES_PER_CONNECTION
+from utils.delivery_metrics import phase_timer, profiled
+from utils.send_engine import TokenBucket, DomainScheduler, AIMDRateController, SenderPool, backoff_delay, campaign_result, RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, STOP_CHECK_SECONDS
+
+class AsyncSMTPConnection:
+    """
+    Minimal asyncio ESMTP client.
+
+    Supports implicit TLS (port 465), STARTTLS, AUTH PLAIN/LOGIN and sends
+    MAIL FROM / RCPT TO / DATA as one batch when the server advertises
+    PIPELINING. Failures are raised as the matching smtplib exceptions so
+    callers can handle both engines the same way.
+    """
+
+    def __init__(self, host, port, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.extensions = {}
+
+    @property
+    def pipelining(self):
+        return 'pipelining' in self.extensions
+
+    async def connect(self):
+        tls = ssl._create_stdlib_context() if self.port == 465 else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=tls),
+            self.timeout)
+        code, message = await self.read_reply()
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, message)
+        await self.ehlo()
+
+    async def read_reply(self):
+        """
+        Read one (possibly multi-line) reply and return (code, message)
+        """
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not line:
+                raise smtplib.SMTPServerDisconnected(
+                    "Connection unexpectedly closed")
+            lines.append(line[4:].strip())
+            if line[3:4] != b'-':
+                break
+        try:
+            code = int(line[:3])
+        except ValueError:
+            code = -1
+        return code, b'\n'.join(lines)
+
+    async def command(self, line):
+        self.writer.write(line.encode('utf-8') + b'\r\n')
+        await self.writer.drain()
+        return await self.read_reply()
+
+    async def ehlo(self):
+        code, message = await self.command('EHLO localhost')
+        if code != 250:
+            raise smtplib.SMTPHeloError(code, message)
+        self.extensions = {}
+        for line in message.decode('latin-1').split('\n')[1:]:
+            keyword, _, params = line.partition(' ')
+            self.extensions[keyword.lower()] = params
+
+    async def starttls(self):
+        code, message = await self.command('STARTTLS')
+        if code != 220:
+            raise smtplib.SMTPResponseException(code, message)
+        context = ssl._create_stdlib_context()
+        if hasattr(self.writer, 'start_tls'):
+            await self.writer.start_tls(context, server_hostname=self.host)
+        else:
+            # Python < 3.11: upgrade the transport and rebuild the writer
+            loop = asyncio.get_running_loop()
+            protocol = self.writer.transport.get_protocol()
+            transport = await loop.start_tls(
+                self.writer.transport, protocol, context, server_hostname=self.host)
+            self.writer = asyncio.StreamWriter(
+                transport, protocol, self.reader, loop)
+        await self.ehlo()
+
+    async def login(self, user, password):
+        methods = self.extensions.get('auth', '').upper().split()
+        if 'PLAIN' in methods or 'LOGIN' not in methods:
+            token = base64.b64encode(
+                f"\0{user}\0{password}".encode('utf-8')).decode('ascii')
+            code, message = await self.command(f'AUTH PLAIN {token}')
+        else:
+            code, message = await self.command('AUTH LOGIN')
+            if code == 334:
+                code, message = await self.command(
+                    base64.b64encode(user.encode('utf-8')).decode('ascii'))
+            if code == 334:
+                code, message = await self.command(
+                    base64.b64encode(password.encode('utf-8')).decode('ascii'))
+        if code not in (235, 503):
+            raise smtplib.SMTPAuthenticationError(code, message)
+
+    async def sendmail(self, from_addr, to_addrs, chunks):
+        """
+        Deliver DATA `chunks` (prepared with prepare_data) to `to_addrs`,
+        pipelining the envelope
+        """
+        envelope = [f'MAIL FROM:<{from_addr}>'] + \
+            [f'RCPT TO:<{addr}>' for addr in to_addrs]
+        if self.pipelining:
+            # RFC 2920: the whole envelope plus DATA goes out in one write
+            self.writer.write(''.join(
+                f'{line}\r\n' for line in envelope + ['DATA']).encode('utf-8'))
+            await self.writer.drain()
+            replies = [await self.read_reply() for _ in envelope]
+            data_reply = await self.read_reply()
+        else:
+            replies = [await self.command(envelope[0])]
+            if replies[0][0] == 250:
+                for line in envelope[1:]:
+                    replies.append(await self.command(line))
+            data_reply = None
+
+        mail_reply, rcpt_replies = replies[0], replies[1:]
+        if mail_reply[0] != 250:
+            await self._abort(data_reply)
+            raise smtplib.SMTPSenderRefused(*mail_reply, from_addr)
+        refused = {addr: reply for addr, reply in zip(to_addrs, rcpt_replies)
+                   if reply[0] not in (250, 251)}
+        if len(refused) == len(to_addrs):
+            await self._abort(data_reply)
+            raise smtplib.SMTPRecipientsRefused(refused)
+        if data_reply is None:
+            data_reply = await self.command('DATA')
+        if data_reply[0] != 354:
+            await self._abort(None)
+            raise smtplib.SMTPDataError(*data_reply)
+
+        for chunk in chunks:
+            self.writer.write(chunk)
+        self.writer.write(b'.\r\n')
+        await self.writer.drain()
+        code, message = await self.read_reply()
+        if code != 250:
+            await self._abort(None)
+            raise smtplib.SMTPDataError(code, message)
+        return refused
+
+    async def _abort(self, data_reply):
+        # A pipelined DATA the server accepted must be closed before RSET
+        if data_reply is not None and data_reply[0] == 354:
+            self.writer.write(b'.\r\n')
+            await self.read_reply()
+        await self.command('RSET')
+
+    async def quit(self):
+        try:
+            await self.command('QUIT')
+        except (smtplib.SMTPException, OSError, asyncio.TimeoutError):
+            pass
+        await self.close()
+
+    async def close(self):
+        """
+        Close the socket without QUIT and wait (up to the timeout) until it is gone
+        """
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), self.timeout)
+            except (OSError, asyncio.TimeoutError):
+                pass
+
+
+async def open_async_smtp_connection(smtp_config, metrics=None):
+    """
+    Open an authenticated asyncio SMTP connection (SSL on 465, STARTTLS
+    otherwise unless smtp_config['starttls'] is False), timing each step
+    into `metrics` if given
+    """
+    connection = AsyncSMTPConnection(smtp_config['host'], smtp_config['port'])
+    with phase_timer(metrics, 'connect'):
+        await connection.connect()
+    if smtp_config['port'] != 465 and smtp_config.get('starttls', True):
+        with phase_timer(metrics, 'tls'):
+            await connection.starttls()
+    with phase_timer(metrics, 'auth'):
+        await connection.login(smtp_config['sender_email'], smtp_config['password'])
+    return connection
+
+
+class AsyncSMTPSession:
+    """
+    asyncio counterpart of SMTPSession: one lazily opened connection that is
+    recycled after `max_messages` messages and re-established on 421 or a
+    dropped link.
+    """
+
+    def __init__(self, smtp_config, max_messages=None, metrics=None):
+        self.smtp_config = smtp_config
+        self.max_messages = max_messages or smtp_config.get(
+            'max_messages_per_connection') or DEFAULT_MESSAGES_PER_CONNECTION
+        self.metrics = metrics
+        self.connection = None
+        self.messages_on_connection = 0
+        self.reconnects = 0
+        self.deferrals = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        if self.connection is None:
+            self.connection = await open_async_smtp_connection(self.smtp_config, self.metrics)
+            self.messages_on_connection = 0
+            if self.metrics is not None:
+                self.metrics.count_connection()
+        return self.connection
+
+    async def close(self):
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            await connection.quit()
+
+    async def reconnect(self):
+        await self.close()
+        self.reconnects += 1
+        connection = await self.connect()
+        if self.metrics is not None:
+            self.metrics.count_reconnect()
+        return connection
+
+    async def sendmail(self, from_addr, to_addrs, chunks):
+        if self.connection is not None and self.messages_on_connection >= self.max_messages:
+            await self.reconnect()
+        connection = await self.connect()
+        try:
+            with phase_timer(self.metrics, 'data'):
+                result = await connection.sendmail(from_addr, to_addrs, chunks)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server is gone; drop our end of the socket before replacing it
+            self.connection = None
+            await connection.close()
+            connection = await self.reconnect()
+            with phase_timer(self.metrics, 'data'):
+                result = await connection.sendmail(from_addr, to_addrs, chunks)
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code != 421:
+                raise
+            self.deferrals += 1
+            connection = await self.reconnect()
+            with phase_timer(self.metrics, 'data'):
+                result = await connection.sendmail(from_addr, to_addrs, chunks)
+        except asyncio.TimeoutError:
+            # The conversation is out of step; never reuse this connection
+            self.connection = None
+            await connection.close()
+            raise
+        self.messages_on_connection += 1
+        return result
+
+
+async def send_single_email_async(recipient_name, recipient_email, subject, body, smtp_config, attachments=None, format_type='markdown', session=None, skeleton=None, fields=None, metrics=None):
+    """
+    asyncio version of send_single_email with the same (success, message) result
+    """
+    success, message, _ = await deliver_email_async(recipient_name, recipient_email, subject, body, smtp_config,
+                                                    attachments, format_type, session, skeleton, fields, metrics)
+    return success, message
+
+
+async def deliver_email_async(recipient_name, recipient_email, subject, body, smtp_config, attachments=None, format_type='markdown', session=None, skeleton=None, fields=None, metrics=None):
+    """
+    asyncio version of email_sender.deliver_email: (success, message, failure)
+    """
+    try:
+        with phase_timer(metrics, 'build'):
+            if skeleton is not None:
+                html_content = compile_template(body, format_type).render(
+                    personalization(recipient_name, recipient_email, fields))
+                chunks = skeleton.chunks(recipient_email, html_content)
+            else:
+                msg = build_email_message(recipient_name, recipient_email, subject,
+                                          body, smtp_config, attachments, format_type, fields)
+                chunks = [prepare_data(message_to_wire(msg))]
+
+        if session is not None:
+            await session.sendmail(smtp_config['sender_email'], [recipient_email], chunks)
+        else:
+            async with AsyncSMTPSession(smtp_config, metrics=metrics) as one_off:
+                await one_off.sendmail(smtp_config['sender_email'], [recipient_email], chunks)
+
+        if metrics is not None:
+            metrics.count_message(True, sum(len(chunk) for chunk in chunks))
+        return True, f"✅ Email with {len(attachments) if attachments else 0} attachment(s) sent to {recipient_name} ({recipient_email})", None
+
+    except Exception as e:
+        if metrics is not None:
+            metrics.count_message(False)
+        return False, f"❌ Failed to send to {recipient_name}: {str(e)}", describe_failure(e)
+
+
+async def run_campaign_async(recipients, subject, body, smtp_config, on_result, attachments=None,
+                             format_type='markdown', max_rate=None, max_concurrency=100, stop=None,
+                             per_domain_concurrency=None, per_domain_rate=None, resolver=None,
+                             adaptive_rate=False, max_attempts=RETRY_MAX_ATTEMPTS,
+                             retry_delay=RETRY_BASE_DELAY, metrics=None, senders=None):
+    """
+    Send to every recipient over `max_concurrency` concurrent SMTP
+    conversations in the running event loop, calling `on_result(index, result)`
+    as each message completes. Domains are interleaved and capped, and
+    `adaptive_rate`, transient-failure retries, `metrics` and a `senders`
+    pool work, as in send_engine.iter_campaign.
+    """
+    pool = senders if senders is not None else SenderPool([smtp_config])
+    # Serialize the invariant part of the message once for the whole campaign
+    pool.skeleton(pool.accounts[0], subject, attachments)
+    bucket = TokenBucket(max_rate)
+    controller = AIMDRateController(bucket, max_rate=max_rate) if adaptive_rate else None
+    scheduler = DomainScheduler(recipients, resolver, per_domain_concurrency, per_domain_rate)
+    loop = asyncio.get_running_loop()
+
+    async def conversation():
+        sessions = {}
+        try:
+            while stop is None or not stop.is_set():
+                if scheduler.wants_read_ahead():
+                    # Reading the list and MX lookups would block the loop
+                    await loop.run_in_executor(None, scheduler.read_ahead)
+                item, wait = scheduler.poll()
+                if item is None:
+                    if wait is None:
+                        return
+                    await asyncio.sleep(min(wait, STOP_CHECK_SECONDS))
+                    continue
+                index, recipient, domain, attempt = item
+                retrying = False
+                try:
+                    account, wait = pool.poll()
+                    while account is None:
+                        if wait is None or (stop is not None and stop.is_set()):
+                            return
+                        await asyncio.sleep(min(wait, STOP_CHECK_SECONDS))
+                        account, wait = pool.poll()
+                    try:
+                        wait = bucket.reserve()
+                        while wait:
+                            if stop is not None and stop.is_set():
+                                return
+                            await asyncio.sleep(min(wait, STOP_CHECK_SECONDS))
+                            wait = bucket.reserve()
+                        session = sessions.get(account)
+                        if session is None:
+                            session = sessions[account] = AsyncSMTPSession(
+                                account.smtp_config, metrics=metrics)
+                        deferrals = session.deferrals
+                        success, message, failure = await deliver_email_async(
+                            recipient['first_name'],
+                            recipient['email'],
+                            subject,
+                            body,
+                            account.smtp_config,
+                            attachments=attachments,
+                            format_type=format_type,
+                            session=session,
+                            skeleton=pool.skeleton(account, subject, attachments),
+                            fields=recipient,
+                            metrics=metrics
+                        )
+                        if pool.record(account, success, failure,
+                                       hand_back=attempt < max_attempts):
+                            # Another account sends it; this one is out of rotation
+                            await sessions.pop(account).close()
+                            scheduler.retry(index, recipient, domain, attempt + 1, 0)
+                            continue
+                    finally:
+                        pool.release(account)
+                    retrying = failure is not None and failure['transient'] and attempt < max_attempts
+                    if retrying:
+                        scheduler.retry(index, recipient, domain, attempt + 1,
+                                        backoff_delay(attempt, retry_delay))
+                        if metrics is not None:
+                            metrics.count_retry(failure['code'])
+                finally:
+                    scheduler.release(domain)
+                if controller is not None:
+                    if session.deferrals > deferrals:
+                        controller.record(421)
+                    controller.record(250 if success else failure['code'])
+                if not retrying:
+                    on_result(index, campaign_result(
+                        recipient, success, message, failure, attempt))
+        finally:
+            for session in sessions.values():
+                await session.close()
+
+    # Every conversation runs on this thread, so one profiler covers them all
+    try:
+        with profiled(metrics):
+            await asyncio.gather(*(conversation() for _ in range(pool.worker_count(max_concurrency))))
+    finally:
+        pool.flush()
+
+
+def iter_campaign_async(recipients, subject, body, smtp_config, **options):
+    """
+    Drop-in replacement for send_engine.iter_campaign backed by the asyncio
+    engine. The event loop runs in a helper thread; `(index, result)` pairs
+    are yielded to the caller as they complete.
+    """
+    done = queue.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def run():
+        try:
+            asyncio.run(run_campaign_async(
+                recipients, subject, body, smtp_config,
+                lambda index, result: done.put((index, result)),
+                stop=stop, **options))
+        finally:
+            done.put(finished)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = done.get()
+            if item is finished:
+                break
+            yield item
+    finally:
+        stop.set()
+        thread.join()
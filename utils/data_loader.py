@@ -1,7 +1,81 @@
+import glob
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import streamlit as st
 from io import BytesIO
 
+# Rows parsed at a time in streaming mode; bounds peak memory for huge lists
+STREAM_CHUNK_ROWS = 50000
+
+# Whitespace as str.split() sees it. The Arrow regex engine's \s is ASCII
+# only, so the other Unicode spaces (no-break, ideographic, ...) are listed
+# literally
+WHITESPACE = '[\\s\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]'
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Arrow-backed strings make the vectorized string ops run in C when available
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    STRING_STORAGE = 'pyarrow'
+except ImportError:
+    pa = pq = None
+    STRING_STORAGE = 'python'
+STRING_DTYPE = f'string[{STRING_STORAGE}]'
+
+# Parsed columns of uploads are kept on disk as Parquet, keyed by content
+# hash, so opening the same list again skips CSV/Excel parsing (needs pyarrow)
+LOAD_CACHE_DIR = os.environ.get(
+    'EMAIL_LOAD_CACHE_DIR', os.path.join('campaign_data', 'uploads'))
+LOAD_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Text columns where at most this share of the values are distinct (first
+# names, companies, cities) are stored as categoricals, the rest as strings
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Parsed uploads, mapped frames and validation reports survive Streamlit
+# reruns here, keyed by upload content hash (and mapping); least recently
+# used entries are evicted past either bound
+PARSE_CACHE_MAX_ENTRIES = 16
+PARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+# Content hashes of uploads by Streamlit file_id, kept apart from the parse
+# cache so they never push parsed frames out
+UPLOAD_DIGEST_MAX_ENTRIES = 256
+_upload_digests = OrderedDict()
+
+# Per-row validation status; one code per row, earlier codes take precedence
+STATUS_OK = 0
+STATUS_MISSING_EMAIL = 1
+STATUS_INVALID_EMAIL = 2
+STATUS_DUPLICATE = 3
+STATUS_ROLE_ACCOUNT = 4
+STATUS_MISSING_NAME = 5
+
+STATUS_LABELS = {
+    STATUS_OK: "OK",
+    STATUS_MISSING_EMAIL: "Missing email",
+    STATUS_INVALID_EMAIL: "Invalid email syntax",
+    STATUS_DUPLICATE: "Duplicate address",
+    STATUS_ROLE_ACCOUNT: "Role account",
+    STATUS_MISSING_NAME: "Missing name",
+}
+
+# Shared mailboxes that rarely belong to a person (matched on the local part)
+ROLE_ACCOUNTS = ('abuse', 'admin', 'billing', 'contact', 'help', 'hello', 'hr',
+                 'info', 'jobs', 'marketing', 'no-reply', 'noreply', 'office',
+                 'postmaster', 'sales', 'support', 'team', 'webmaster')
+_ROLE_PATTERN = '^(?:' + '|'.join(re.escape(r) for r in ROLE_ACCOUNTS) + ')@'
+
 
 def load_data_from_file1(uploaded_file):
     """
@@ -33,19 +107,120 @@ def load_sample_data():
     """
     Load sample data for demonstration
     """
-    return pd.read_csv('data/sample_contacts.csv')
+    return compact_frame(pd.read_csv('data/sample_contacts.csv'))
+
+
+def compact_strings(values):
+    """
+    A text Series in its most compact form: categorical codes when values
+    repeat a lot (see CATEGORY_MAX_UNIQUE_RATIO), Arrow-backed strings
+    otherwise. Other Series are returned unchanged.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    if values.dtype != object and not isinstance(values.dtype, pd.StringDtype):
+        return values
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        # Mixed numbers and text keep their Python values
+        return values
+    if len(values) and values.nunique(dropna=True) <= CATEGORY_MAX_UNIQUE_RATIO * len(values):
+        return values.astype('category')
+    return values.astype(STRING_DTYPE)
+
+
+def compact_frame(df):
+    """
+    `df` with every text column stored by compact_strings instead of as
+    Python string objects
+    """
+    return pd.DataFrame({column: compact_strings(df[column]) for column in df.columns},
+                        index=df.index, copy=False)
+
+
+def frame_nbytes(df):
+    """
+    Bytes held by a DataFrame's values, strings included
+    """
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+
+def format_bytes(nbytes):
+    if nbytes >= 1024 * 1024:
+        return f"{nbytes / (1024 * 1024):,.1f} MB"
+    return f"{nbytes / 1024:,.0f} KB"
 
 
 def validate_email_format(email):
     """
     Basic email format validation
     """
-    import re
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    return isinstance(email, str) and bool(EMAIL_PATTERN.match(email))
+
+
+class ValidationReport:
+    """
+    Result of validate_contacts.
 
+    `statuses` holds one STATUS_* code per row (int8, aligned with the
+    validated frame) and `counts` the number of rows per status label.
+    """
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.total = len(statuses)
+        tally = np.bincount(statuses, minlength=len(STATUS_LABELS))
+        self.counts = {label: int(tally[code])
+                       for code, label in STATUS_LABELS.items()}
+
+    @property
+    def problem_count(self):
+        return self.total - self.counts[STATUS_LABELS[STATUS_OK]]
+
+    def mask(self, status):
+        """
+        Boolean row mask for one status code
+        """
+        return self.statuses == status
+
+    def rows(self, df, status):
+        """
+        Rows of `df` that were classified with `status`
+        """
+        return df[self.mask(status)]
+
+
+def validate_contacts(df, email_column='email', name_column='first_name'):
+    """
+    Classify every row in one vectorized pass.
 
-def validate_dataframe(df):
+    Checks, in order of precedence: missing email, invalid syntax, duplicate
+    address (case-insensitive, first occurrence kept), role account and
+    missing name. Returns a ValidationReport.
+    """
+    emails = df[email_column].astype(STRING_DTYPE).str.strip()
+    missing = emails.isna() | (emails == '')
+    invalid = ~emails.str.match(EMAIL_PATTERN.pattern).fillna(False)
+    lowered = emails.str.lower()
+    duplicate = lowered.duplicated(keep='first')
+    role = lowered.str.match(_ROLE_PATTERN).fillna(False)
+
+    if name_column in df.columns:
+        names = df[name_column].astype(STRING_DTYPE).str.strip()
+        missing_name = (names.isna() | (names == '')).to_numpy(dtype=bool)
+    else:
+        missing_name = np.zeros(len(df), dtype=bool)
+
+    statuses = np.select(
+        [missing.to_numpy(dtype=bool), invalid.to_numpy(dtype=bool),
+         duplicate.to_numpy(dtype=bool), role.to_numpy(dtype=bool), missing_name],
+        [STATUS_MISSING_EMAIL, STATUS_INVALID_EMAIL,
+         STATUS_DUPLICATE, STATUS_ROLE_ACCOUNT, STATUS_MISSING_NAME],
+        default=STATUS_OK
+    ).astype(np.int8)
+    return ValidationReport(statuses)
+
+
+def validate_dataframe(df, report=None):
     """
     Validate the loaded dataframe
     """
@@ -56,15 +231,19 @@ def validate_dataframe(df):
         errors.append("The uploaded file is empty.")
         return errors
 
+    if report is None:
+        report = validate_contacts(df)
+
     # Validate email format
-    invalid_emails = df[~df['email'].apply(
-        validate_email_format)]['email'].tolist()
+    invalid_emails = report.rows(df, STATUS_INVALID_EMAIL)[
+        'email'].astype(str).tolist()
     if invalid_emails:
         errors.append(
             f"Invalid email formats: {', '.join(invalid_emails[:3])}")
 
     # Check for missing values
-    missing_emails = df[df['email'].isna()]['first_name'].tolist()
+    missing_emails = report.rows(df, STATUS_MISSING_EMAIL)[
+        'first_name'].astype(str).tolist()
     if missing_emails:
         errors.append(f"Missing emails for: {', '.join(missing_emails[:3])}")
 
@@ -87,8 +266,10 @@ def validate_dataframe_with_mapping(df, mapping):
             f"Selected email column '{mapping['email']}' not found in data.")
     else:
         # Check for invalid emails in the mapped column
-        invalid_emails = df[~df[mapping['email']].apply(
-            validate_email_format)][mapping['email']].tolist()
+        report = validate_contacts(
+            df, mapping['email'], mapping.get('first_name'))
+        invalid_emails = report.rows(df, STATUS_INVALID_EMAIL)[
+            mapping['email']].tolist()
         if invalid_emails:
             errors.append(
                 f"Invalid email formats found: {', '.join(map(str, invalid_emails[:3]))}")
@@ -118,6 +299,156 @@ def extract_first_name1(full_name):
     return parts[0] if parts else name_str
 
 
+def load_columns(uploaded_file, columns=None):
+    """
+    Parse an upload in full, keeping only `columns` (all when None), with
+    text stored compactly (see compact_frame). Columns are pruned by the
+    parser itself, so unused ones are never materialized.
+    """
+    stream = _open_upload(uploaded_file)
+    usecols = list(columns) if columns is not None else None
+    if uploaded_file.name.endswith('.csv'):
+        df = pd.read_csv(stream, usecols=usecols)
+    elif uploaded_file.name.endswith(('.xlsx', '.xls')):
+        if usecols is None:
+            df = pd.read_excel(stream)
+            df.columns = _excel_column_names(df.columns)
+        else:
+            # Columns are chosen by the names the preview showed (see
+            # _excel_column_names); pick them by position
+            names = _excel_column_names(pd.read_excel(stream, nrows=0).columns)
+            missing = [column for column in usecols if column not in names]
+            if missing:
+                raise ValueError(f"Columns not found in the file: {missing}")
+            positions = sorted(names.index(column) for column in set(usecols))
+            stream.seek(0)
+            df = pd.read_excel(stream, usecols=positions)
+            df.columns = [names[position] for position in positions]
+    else:
+        raise ValueError("Unsupported file format. Please upload CSV or Excel.")
+    if usecols is not None:
+        df = df[usecols]
+    return compact_frame(df)
+
+
+def _load_cache_paths(digest, directory=LOAD_CACHE_DIR):
+    """
+    Cached Parquet files of an upload, the whole-file one first
+    """
+    whole = os.path.join(directory, f"{digest}.parquet")
+    partial = sorted(glob.glob(os.path.join(directory, f"{digest}-*.parquet")))
+    return ([whole] if os.path.exists(whole) else []) + partial
+
+
+def _read_load_cache(digest, columns, directory=LOAD_CACHE_DIR):
+    """
+    `columns` (all when None) of an upload from the on-disk cache, or None
+    """
+    for path in _load_cache_paths(digest, directory):
+        whole = path.endswith(f"{digest}.parquet")
+        try:
+            if columns is None and not whole:
+                continue
+            if columns is not None and not set(columns) <= set(pq.read_schema(path).names):
+                continue
+            # Text comes back in the same compact string dtype it was stored from
+            df = pq.read_table(path, columns=columns and list(columns)).to_pandas(
+                types_mapper={pa.string(): pd.StringDtype(STRING_STORAGE),
+                              pa.large_string(): pd.StringDtype(STRING_STORAGE)}.get)
+            # Recently used files survive pruning longest
+            os.utime(path)
+            return df
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def _write_load_cache(df, digest, columns, directory=LOAD_CACHE_DIR,
+                      max_bytes=LOAD_CACHE_MAX_BYTES):
+    """
+    Store loaded columns as Parquet (owner-only, written atomically) and
+    drop the least recently used files beyond `max_bytes`
+    """
+    os.makedirs(directory, exist_ok=True)
+    if columns is None:
+        name = f"{digest}.parquet"
+    else:
+        name = f"{digest}-{hashlib.sha256(repr(sorted(columns)).encode('utf-8')).hexdigest()[:12]}.parquet"
+    path = os.path.join(directory, name)
+    partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+    try:
+        df.to_parquet(partial, index=False)
+        os.chmod(partial, 0o600)
+        os.replace(partial, path)
+    except Exception:
+        # Columns pyarrow cannot store (e.g. mixed numbers and text) are just not cached
+        if os.path.exists(partial):
+            os.remove(partial)
+        return
+
+    files = []
+    for cached in glob.glob(os.path.join(directory, "*.parquet")):
+        try:
+            stat = os.stat(cached)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, cached))
+    total = sum(size for _, size, _ in files)
+    for _, size, cached in sorted(files):
+        if total <= max_bytes or cached == path:
+            continue
+        try:
+            os.remove(cached)
+            total -= size
+        except OSError:
+            pass
+
+
+def load_columns_cached(uploaded_file, columns=None, digest=None):
+    """
+    load_columns served from, in order, the in-memory parse cache, the
+    on-disk Parquet cache (see LOAD_CACHE_DIR) or the upload itself.
+    Returns (df, message); df is None if the upload could not be parsed.
+    The frame must be treated as read-only.
+    """
+    digest = digest or upload_digest(uploaded_file)
+    columns = tuple(columns) if columns is not None else None
+    key = ('columns', digest, columns)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached, f"Loaded {len(cached):,} rows (already in memory)."
+
+    started = time.perf_counter()
+    df = _read_load_cache(digest, columns) if pq is not None else None
+    if df is not None:
+        source = "from the columnar cache"
+    else:
+        try:
+            df = load_columns(uploaded_file, columns)
+        except Exception as e:
+            return None, f"Error loading file: {str(e)}"
+        source = "from the file"
+        if pq is not None:
+            _write_load_cache(df, digest, columns)
+    _cache_put(key, df, frame_nbytes(df))
+    what = "all columns" if columns is None else f"{len(columns)} column{'s' if len(columns) != 1 else ''}"
+    return df, f"Loaded {len(df):,} rows, {what}, {source} in {time.perf_counter() - started:.1f}s."
+
+
+def preview_data_from_file_cached(uploaded_file, n_rows=100):
+    """
+    preview_data_from_file parsed once per upload and row count
+    """
+    key = ('preview', upload_digest(uploaded_file), n_rows)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    df, message = preview_data_from_file(uploaded_file, n_rows)
+    if df is None:
+        return df, message
+    return _cache_put(key, (df, message), frame_nbytes(df))
+
+
 def load_data_from_file(uploaded_file):
     """
     Load data from uploaded CSV or Excel file
@@ -130,7 +461,7 @@ def load_data_from_file(uploaded_file):
         else:
             return None, "Unsupported file format. Please upload CSV or Excel."
 
-        return df, "Data loaded successfully! Please map your columns below."
+        return compact_frame(df), "Data loaded successfully! Please map your columns below."
 
     except Exception as e:
         return None, f"Error loading file: {str(e)}"
@@ -157,29 +488,272 @@ def extract_first_name(full_name):
     return parts[0] if parts else name_str
 
 
+def extract_first_names(names):
+    """
+    Vectorized extract_first_name: first word of every value, "" for blanks
+    """
+    stripped = names.astype(STRING_DTYPE).str.strip()
+    return stripped.str.replace(f'{WHITESPACE}.*$', '', regex=True).fillna('')
+
+
+def extract_last_names(names):
+    """
+    Last word of every multi-word value, "" for single words and blanks
+    """
+    stripped = names.astype(STRING_DTYPE).str.strip()
+    multi_word = stripped.str.contains(
+        WHITESPACE, regex=True).fillna(False).to_numpy(dtype=bool)
+    last = stripped.str.replace(f'^.*{WHITESPACE}', '', regex=True)
+    return last.where(multi_word, '').fillna('')
+
+
+def needs_name_extraction(column_name):
+    """
+    Whether a source column probably holds full names ("Name", "Full Name", ...)
+    """
+    column_name_lower = str(column_name).lower()
+    return any(term in column_name_lower for term in ['name', 'full', 'complete'])
+
+
+def template_field_name(column_name):
+    """
+    Placeholder-safe field name for a custom column ("Job Title" -> "job_title")
+    """
+    return re.sub(r'\W+', '_', str(column_name).strip()).strip('_').lower()
+
+
 def apply_column_mapping(df, mapping):
     """
     Apply column mapping to create standardized dataframe
+
+    `mapping` maps a field name to a source column. 'email' is taken as-is;
+    'first_name' and 'last_name' are extracted when the source looks like a
+    full-name column; any other field (company, custom columns) is copied
+    through. Unchanged columns are referenced, not copied; extracted names
+    are stored compactly (see compact_strings).
+    """
+    columns = {}
+    for field, source_column in mapping.items():
+        if not source_column:
+            continue
+        if field == 'first_name' and needs_name_extraction(source_column):
+            columns[field] = compact_strings(extract_first_names(df[source_column]))
+        elif field == 'last_name' and needs_name_extraction(source_column) \
+                and source_column == mapping.get('first_name'):
+            columns[field] = compact_strings(extract_last_names(df[source_column]))
+        else:
+            columns[field] = df[source_column]
+
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def _open_upload(uploaded_file):
+    """
+    Independent read handle on an upload, so several readers never share a position
+    """
+    return BytesIO(uploaded_file.getvalue())
+
+
+def _excel_column_names(labels):
+    """
+    Column names of an Excel sheet as the app shows them: pandas' header
+    labels (blank cells as 'Unnamed: n', repeats as 'X.1'), as text. Every
+    Excel reader here names columns this way, so a column picked from a
+    preview can be found again in the full file.
     """
-    mapped_df = pd.DataFrame()
+    return [str(label) for label in labels]
 
-    # Map email column
-    if 'email' in mapping and mapping['email']:
-        mapped_df['email'] = df[mapping['email']]
 
-    # Map first_name column with extraction if needed
-    if 'first_name' in mapping and mapping['first_name']:
-        source_column = mapping['first_name']
+def _iter_excel_chunks(stream, chunksize):
+    """
+    Yield DataFrames of `chunksize` rows from the first sheet of an xlsx file
+    without loading the whole workbook
+    """
+    from openpyxl import load_workbook
+
+    columns = _excel_column_names(pd.read_excel(stream, nrows=0).columns)
+    stream.seek(0)
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # pandas drops trailing blank header cells; data may still reach them
+        columns += [f"Unnamed: {i}" for i in range(len(columns), len(header))]
+        width = len(columns)
+        batch = []
+        for row in rows:
+            batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def read_data_chunks(uploaded_file, chunksize=STREAM_CHUNK_ROWS):
+    """
+    Yield the raw rows of a CSV or Excel upload as DataFrames of at most
+    `chunksize` rows. Only .xls files (no streaming reader) are parsed whole.
+    """
+    stream = _open_upload(uploaded_file)
+    if uploaded_file.name.endswith('.csv'):
+        yield from pd.read_csv(stream, chunksize=chunksize)
+    elif uploaded_file.name.endswith('.xlsx'):
+        yield from _iter_excel_chunks(stream, chunksize)
+    elif uploaded_file.name.endswith('.xls'):
+        df = pd.read_excel(stream)
+        df.columns = _excel_column_names(df.columns)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        raise ValueError(
+            "Unsupported file format. Please upload CSV or Excel.")
+
 
-        # Check if this might be a full name column
-        column_name_lower = source_column.lower()
-        needs_extraction = any(term in column_name_lower for term in [
-                               'name', 'full', 'complete'])
+def preview_data_from_file(uploaded_file, n_rows=100):
+    """
+    Load only the first `n_rows` rows of an upload, for column mapping and preview
+    """
+    try:
+        df = next(read_data_chunks(uploaded_file, n_rows), None)
+        if df is None:
+            return None, "The uploaded file is empty."
+        return df, f"Streaming mode: previewing the first {len(df)} rows. Please map your columns below."
+
+    except Exception as e:
+        return None, f"Error loading file: {str(e)}"
 
-        if needs_extraction:
-            mapped_df['first_name'] = df[source_column].apply(
-                extract_first_name)
+
+def count_data_rows(uploaded_file, on_progress=None):
+    """
+    Count data rows by scanning the upload chunk by chunk.
+    `on_progress(rows_so_far)` is called after every chunk.
+    """
+    total = 0
+    for chunk in read_data_chunks(uploaded_file):
+        total += len(chunk)
+        if on_progress is not None:
+            on_progress(total)
+    return total
+
+
+def iter_contact_chunks(uploaded_file, mapping, chunksize=STREAM_CHUNK_ROWS, stats=None):
+    """
+    Map and validate an upload chunk by chunk, yielding only sendable rows.
+
+    Rows without a well-formed email are dropped; if a `stats` dict is given
+    its 'rows' and 'skipped' counters are updated as chunks are processed.
+    """
+    identity = all(field == column for field, column in mapping.items())
+    for chunk in read_data_chunks(uploaded_file, chunksize):
+        # Files that already have the standard columns are used as-is
+        if identity:
+            mapped = chunk[list(mapping)].copy()
         else:
-            mapped_df['first_name'] = df[source_column]
+            mapped = apply_column_mapping(chunk, mapping)
+        emails = mapped['email'].astype(STRING_DTYPE).str.strip()
+        valid = emails.str.match(
+            EMAIL_PATTERN.pattern).fillna(False).to_numpy(dtype=bool)
+        mapped['email'] = emails
+        mapped['first_name'] = mapped['first_name'].fillna('').astype(str)
+        if stats is not None:
+            stats['rows'] = stats.get('rows', 0) + len(mapped)
+            stats['skipped'] = stats.get(
+                'skipped', 0) + int((~valid).sum())
+        yield mapped[valid]
+
+
+def iter_recipients(uploaded_file, mapping, chunksize=STREAM_CHUNK_ROWS, stats=None):
+    """
+    Stream recipient dicts (one key per mapped field) straight from an
+    upload, holding at most one chunk of rows in memory
+    """
+    for chunk in iter_contact_chunks(uploaded_file, mapping, chunksize, stats):
+        yield from chunk.to_dict('records')
+
+
+def _cache_get(key):
+    with _parse_cache_lock:
+        entry = _parse_cache.get(key)
+        if entry is None:
+            return None
+        _parse_cache.move_to_end(key)
+        return entry[0]
+
+
+def _cache_put(key, value, nbytes):
+    with _parse_cache_lock:
+        _parse_cache[key] = (value, nbytes)
+        _parse_cache.move_to_end(key)
+        while len(_parse_cache) > 1 and (
+                len(_parse_cache) > PARSE_CACHE_MAX_ENTRIES or parse_cache_size() > PARSE_CACHE_MAX_BYTES):
+            _parse_cache.popitem(last=False)
+    return value
+
+
+def parse_cache_size():
+    """
+    Approximate bytes held by the parse cache
+    """
+    return sum(nbytes for _, nbytes in list(_parse_cache.values()))
 
-    return mapped_df
+
+def clear_parse_cache():
+    with _parse_cache_lock:
+        _parse_cache.clear()
+
+
+def upload_digest(uploaded_file):
+    """
+    SHA-256 of an upload's content, computed once per Streamlit file_id
+    """
+    file_id = getattr(uploaded_file, 'file_id', None)
+    if file_id is not None:
+        with _parse_cache_lock:
+            digest = _upload_digests.get(file_id)
+            if digest is not None:
+                _upload_digests.move_to_end(file_id)
+                return digest
+    digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    if file_id is not None:
+        with _parse_cache_lock:
+            _upload_digests[file_id] = digest
+            while len(_upload_digests) > UPLOAD_DIGEST_MAX_ENTRIES:
+                _upload_digests.popitem(last=False)
+    return digest
+
+
+def mapping_key(mapping):
+    """
+    Hashable, order-independent form of a column mapping
+    """
+    return tuple(sorted((mapping or {}).items()))
+
+
+def apply_column_mapping_cached(df, mapping, digest):
+    """
+    apply_column_mapping reused while the upload and mapping are unchanged
+    """
+    key = ('mapped', digest, mapping_key(mapping))
+    mapped = _cache_get(key)
+    if mapped is None:
+        mapped = apply_column_mapping(df, mapping)
+        # Mapped columns mostly reference the parsed frame; count only new ones
+        _cache_put(key, mapped, int(mapped.memory_usage(deep=False).sum()))
+    return mapped
+
+
+def validate_contacts_cached(df, data_key):
+    """
+    validate_contacts reused while `data_key` (digest plus mapping) is unchanged
+    """
+    key = ('validation', data_key)
+    report = _cache_get(key)
+    if report is None:
+        report = validate_contacts(df)
+        _cache_put(key, report, report.statuses.nbytes)
+    return report
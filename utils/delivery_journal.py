@@ -0,0 +1,150 @@
+import hashlib
+import os
+import time
+
+import pandas as pd
+
+from utils.send_plan import HashSuppression, hash_emails, normalize_emails
+
+# One append-only journal file per campaign
+JOURNAL_DIR = os.environ.get(
+    'EMAIL_JOURNAL_DIR', os.path.join('campaign_data', 'journals'))
+
+# Journal line states
+FAILED, DELIVERED, REJECTED = '0', '1', '2'
+_STATE_RANK = (FAILED, REJECTED, DELIVERED)
+
+# Outcomes are fsync'ed to disk at least this often
+JOURNAL_FLUSH_RECORDS = 100
+JOURNAL_FLUSH_SECONDS = 1.0
+
+
+def campaign_id(subject, body, source=None):
+    """
+    Stable id for a campaign: the same contact data (`source`, e.g. the
+    upload digest and mapping), subject and template always map to the
+    same journal, across reruns and restarts
+    """
+    key = repr((source, subject, body)).encode('utf-8')
+    return hashlib.sha256(key).hexdigest()[:16]
+
+
+def journal_path(campaign, directory=JOURNAL_DIR):
+    return os.path.join(directory, f"{campaign}.journal")
+
+
+def _clean(text):
+    # Keep every record on a single tab-separated line
+    return str(text).replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+
+
+class DeliveryJournal:
+    """
+    Append-only record of delivery outcomes for one campaign.
+
+    Each outcome is one line, `<state>\\t<email>\\t<unix time>\\t<message>`,
+    where state is 1 (delivered), 0 (failed, worth another try) or 2
+    (rejected permanently). Lines are buffered and written + fsync'ed in
+    batches of `flush_records` or every `flush_seconds`, so a crash loses
+    at most one batch; a torn last line is ignored when the journal is
+    read back.
+    """
+
+    def __init__(self, campaign, directory=JOURNAL_DIR, flush_records=JOURNAL_FLUSH_RECORDS,
+                 flush_seconds=JOURNAL_FLUSH_SECONDS):
+        self.campaign = campaign
+        self.path = journal_path(campaign, directory)
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, email, success, message='', permanent=False):
+        state = DELIVERED if success else (REJECTED if permanent else FAILED)
+        self.buffer.append(
+            f"{state}\t{_clean(email)}\t{time.time():.3f}\t{_clean(message)}\n")
+        if len(self.buffer) >= self.flush_records or \
+                time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            os.write(self.fd, ''.join(self.buffer).encode('utf-8'))
+            os.fsync(self.fd)
+            self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.fd is not None:
+            self.flush()
+            os.close(self.fd)
+            self.fd = None
+
+
+def _scan(path):
+    """
+    Yield (state, email, message) for every complete journal line
+    """
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='\n') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                parts = line.rstrip('\n').split('\t', 3)
+                if len(parts) == 4 and parts[0] in (FAILED, DELIVERED, REJECTED):
+                    yield parts[0], parts[1], parts[3]
+    except FileNotFoundError:
+        return
+
+
+def finished_addresses(campaign, directory=JOURNAL_DIR):
+    """
+    Addresses an earlier run of a campaign delivered to or that were
+    rejected permanently (never worth retrying), as a hash set that plugs
+    into compile_send_plan / iter_planned_recipients (`delivered=`)
+    """
+    emails = [email for state, email, _ in _scan(journal_path(campaign, directory))
+              if state != FAILED]
+    _, normalized = normalize_emails(pd.Series(emails, dtype=object))
+    return HashSuppression(hash_emails(normalized))
+
+
+def journal_summary(campaign, directory=JOURNAL_DIR):
+    """
+    Counts for a campaign's journal: addresses delivered, rejected
+    permanently, and failed on their last attempt (resume retries these).
+    None if the campaign was never started.
+    """
+    path = journal_path(campaign, directory)
+    if not os.path.exists(path):
+        return None
+    outcome = {}
+    for state, email, _ in _scan(path):
+        key = email.strip().lower()
+        # Delivered beats rejected beats a failure that may be retried
+        outcome[key] = max(outcome.get(key, FAILED), state, key=_STATE_RANK.index)
+    states = list(outcome.values())
+    return {
+        'delivered': states.count(DELIVERED),
+        'rejected': states.count(REJECTED),
+        'failed': states.count(FAILED),
+        'updated_at': os.path.getmtime(path),
+    }
+
+
+def reset_journal(campaign, directory=JOURNAL_DIR):
+    """
+    Start a campaign over; the previous journal is kept next to it
+    with a timestamp suffix
+    """
+    path = journal_path(campaign, directory)
+    if os.path.exists(path):
+        os.replace(path, f"{path}.{int(time.time())}")
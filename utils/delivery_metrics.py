@@ -0,0 +1,331 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Delivery phases timed for every message / connection:
+#   build    personalize the template and splice the message together
+#   connect  TCP connect and server greeting (includes the handshake on port 465)
+#   tls      STARTTLS negotiation
+#   auth     AUTH PLAIN / LOGIN
+#   data     MAIL FROM through the server's reply to the end of DATA
+PHASES = ('build', 'connect', 'tls', 'auth', 'data')
+
+# Histogram bucket upper bounds in seconds (Prometheus `le` labels)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prometheus text file for node_exporter's textfile collector or any scraper
+METRICS_FILE = os.environ.get(
+    'EMAIL_METRICS_FILE', os.path.join('campaign_data', 'metrics.prom'))
+
+# cProfile dumps of profiled campaigns
+PROFILE_DIR = os.environ.get(
+    'EMAIL_PROFILE_DIR', os.path.join('campaign_data', 'profiles'))
+
+_NO_TIMER = nullcontext()
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram: one bisect and two additions per
+    observation, no samples kept
+    """
+
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # Last slot counts observations above the largest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        """
+        Estimate of the q-quantile (0-1), interpolated within its bucket
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class _PhaseTimer:
+    __slots__ = ('metrics', 'phase', 'start')
+
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.phase, time.perf_counter() - self.start)
+
+
+class DeliveryMetrics:
+    """
+    Phase timings and counters for one or more campaigns.
+
+    The send path records into it through phase_timer() and the count_*
+    methods; the Send tab reads snapshot() and the worker exports
+    to_prometheus(). One lock guards everything; each update holds it for
+    a handful of additions.
+
+    Between start_capture() and stop_capture() a campaign can also be
+    profiled: every sending thread that enters profiled() runs under its
+    own cProfile.Profile (merged afterwards), and tracemalloc records
+    allocations. Both slow sending down noticeably, so they are meant for
+    a single diagnostic campaign.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.messages = Counter()
+        self.bytes_sent = 0
+        self.connections = 0
+        self.reconnects = 0
+        self.retries = Counter()
+        self.started = time.time()
+        self.profile = False
+        self.trace_memory = False
+        self.profiles = []
+        self.memory_snapshot = None
+
+    def observe(self, phase, seconds):
+        with self.lock:
+            self.phases[phase].observe(seconds)
+
+    def time(self, phase):
+        """
+        Context manager that records the time spent inside it under `phase`
+        """
+        return _PhaseTimer(self, phase)
+
+    def count_message(self, success, size=0):
+        with self.lock:
+            self.messages['sent' if success else 'failed'] += 1
+            self.bytes_sent += size
+
+    def count_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def count_reconnect(self):
+        with self.lock:
+            self.reconnects += 1
+
+    def count_retry(self, code):
+        """
+        A transient failure that will be retried, by SMTP reply code
+        ('none' for timeouts and dropped connections)
+        """
+        with self.lock:
+            self.retries['none' if code is None else str(code)] += 1
+
+    def snapshot(self):
+        """
+        Plain-dict copy of the current figures, with p50/p95/mean per phase
+        in milliseconds
+        """
+        with self.lock:
+            phases = {}
+            for phase, histogram in self.phases.items():
+                phases[phase] = {
+                    'count': histogram.count,
+                    'total_s': histogram.total,
+                    'mean_ms': None if histogram.mean is None else histogram.mean * 1000,
+                    'p50_ms': _ms(histogram.quantile(0.5)),
+                    'p95_ms': _ms(histogram.quantile(0.95)),
+                }
+            return {
+                'phases': phases,
+                'sent': self.messages['sent'],
+                'failed': self.messages['failed'],
+                'bytes_sent': self.bytes_sent,
+                'connections': self.connections,
+                'reconnects': self.reconnects,
+                'retries': dict(self.retries),
+                'elapsed_s': time.time() - self.started,
+            }
+
+    def to_prometheus(self, prefix='email'):
+        """
+        Everything in the Prometheus text exposition format
+        """
+        lines = [
+            f'# HELP {prefix}_phase_seconds Time spent in each delivery phase',
+            f'# TYPE {prefix}_phase_seconds histogram',
+        ]
+        with self.lock:
+            for phase, histogram in self.phases.items():
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {histogram.total}')
+                lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+
+            lines += [
+                f'# HELP {prefix}_messages_total Delivery attempts by outcome',
+                f'# TYPE {prefix}_messages_total counter',
+            ]
+            lines += [f'{prefix}_messages_total{{outcome="{outcome}"}} {self.messages[outcome]}'
+                      for outcome in ('sent', 'failed')]
+            lines += [
+                f'# HELP {prefix}_retries_total Transient failures scheduled for retry, by SMTP reply code',
+                f'# TYPE {prefix}_retries_total counter',
+            ]
+            lines += [f'{prefix}_retries_total{{code="{code}"}} {count}'
+                      for code, count in sorted(self.retries.items())]
+            for name, value, help_text in (
+                    ('bytes_sent_total', self.bytes_sent, 'Message bytes written in DATA'),
+                    ('connections_total', self.connections, 'SMTP connections opened'),
+                    ('reconnects_total', self.reconnects, 'Connections reopened after a drop, a 421 or recycling')):
+                lines += [f'# HELP {prefix}_{name} {help_text}',
+                          f'# TYPE {prefix}_{name} counter',
+                          f'{prefix}_{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=METRICS_FILE):
+        """
+        Atomically replace `path` with the current figures, so a scraper
+        never reads a half-written file
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(partial, path)
+        return path
+
+    @contextmanager
+    def profiled(self):
+        """
+        Run the enclosed block of one sending thread under cProfile when
+        profiling is on
+        """
+        if not self.profile:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self.lock:
+                self.profiles.append(profiler)
+
+    def start_capture(self, profile=False, trace_memory=False):
+        """
+        Profile (cProfile) and/or trace allocations (tracemalloc) until
+        stop_capture(), discarding any earlier capture
+        """
+        with self.lock:
+            self.profiles = []
+            self.memory_snapshot = None
+            self.profile = profile
+            self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+
+    def stop_capture(self):
+        """
+        End the capture; the results stay available to capture_report()
+        and save_capture()
+        """
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.memory_snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        self.profile = self.trace_memory = False
+
+    def profile_stats(self):
+        """
+        pstats.Stats merged across all profiled threads, or None
+        """
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        return stats
+
+    def capture_report(self, limit=25):
+        """
+        Text summary of the profile (by cumulative time) and the biggest
+        allocation sites, for whichever captures were taken
+        """
+        sections = []
+        stats = self.profile_stats()
+        if stats is not None:
+            stats.stream = io.StringIO()
+            stats.sort_stats('cumulative').print_stats(limit)
+            sections.append(stats.stream.getvalue().strip())
+        if self.memory_snapshot is not None:
+            top = self.memory_snapshot.statistics('lineno')[:limit]
+            sections.append("Top allocations by line:\n" + '\n'.join(str(stat) for stat in top))
+        return '\n\n'.join(sections)
+
+    def save_capture(self, name, directory=PROFILE_DIR):
+        """
+        Write `<name>.prof` (the merged profile, for pstats or snakeviz) and
+        `<name>.txt` (capture_report) for whatever was captured; returns the
+        paths written
+        """
+        paths = []
+        report = self.capture_report()
+        if not report:
+            return paths
+        os.makedirs(directory, exist_ok=True)
+        stats = self.profile_stats()
+        if stats is not None:
+            paths.append(os.path.join(directory, f"{name}.prof"))
+            stats.dump_stats(paths[-1])
+        paths.append(os.path.join(directory, f"{name}.txt"))
+        with open(paths[-1], 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+        return paths
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def phase_timer(metrics, phase):
+    """
+    metrics.time(phase), or a shared no-op context when metrics is None
+    """
+    return _NO_TIMER if metrics is None else metrics.time(phase)
+
+
+def profiled(metrics):
+    return _NO_TIMER if metrics is None else metrics.profiled()
@@ -1,11 +1,303 @@
+import asyncio
+import base64
+import hashlib
+import html
+import re
 import smtplib
+import socket
+import ssl
+import threading
+import uuid
+from collections import OrderedDict
+from io import BytesIO
 import markdown
 import streamlit as st
+from email.generator import BytesGenerator
+from email.header import Header
+from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
+from email.utils import formataddr, formatdate, make_msgid
 from markdown.extensions import Extension
 from email.mime.application import MIMEApplication
+from utils.delivery_metrics import phase_timer
+
+
+# Reconnect after this many messages unless smtp_config overrides it
+DEFAULT_MESSAGES_PER_CONNECTION = 100
+
+# Transient "try again later" replies; the server is asking us to slow down
+DEFERRAL_CODES = frozenset({421, 450, 451, 452})
+
+# RFC 3463 enhanced status code (e.g. 5.1.1) at the start of a reply
+ENHANCED_STATUS_PATTERN = re.compile(r'^\s*([245]\.\d{1,3}\.\d{1,3})\b')
+
+# Errors raised before any SMTP reply that are worth another attempt
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, OSError, asyncio.TimeoutError)
+# ...except these: smtplib errors are OSErrors too, but without a reply they
+# mean the server won't do what we need (no AUTH, no STARTTLS), and an
+# untrusted certificate stays untrusted
+PERMANENT_ERRORS = (smtplib.SMTPException, ssl.SSLCertVerificationError)
+
+# Template variables such as {first_name} and {email}
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+# A placeholder inside a Markdown autolink such as <{email}> or <https://x/{id}>
+_AUTOLINK_PLACEHOLDER = re.compile(r'<[^<>\s]*\{\w+\}[^<>\s]*>')
+# Private-use characters mark placeholder positions through Markdown rendering
+_SENTINEL = '\ue000{}\ue001'
+_SENTINEL_PATTERN = re.compile('\ue000(\\d+)\ue001')
+
+# Compiled templates kept per (template hash, format), least recently used evicted
+TEMPLATE_CACHE_SIZE = 32
+_template_cache = OrderedDict()
+_template_cache_lock = threading.Lock()
+
+# Lone CR or LF that must become CRLF on the wire
+_BARE_EOL = re.compile(rb'\r\n|\r|\n')
+
+# Encoded attachments kept per content hash, bounded by total encoded bytes
+ATTACHMENT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+_attachment_cache = OrderedDict()
+_attachment_cache_lock = threading.Lock()
+
+
+def open_smtp_connection(smtp_config, metrics=None):
+    """
+    Open an authenticated SMTP connection (SSL on 465, STARTTLS otherwise,
+    unless smtp_config sets 'starttls' to False for a plaintext local relay).
+    Connect, TLS and AUTH times go to `metrics` (a DeliveryMetrics) if given.
+    """
+    with phase_timer(metrics, 'connect'):
+        if smtp_config['port'] == 465:
+            server = smtplib.SMTP_SSL(smtp_config['host'], smtp_config['port'])
+        else:
+            server = smtplib.SMTP(smtp_config['host'], smtp_config['port'])
+    if smtp_config['port'] != 465 and smtp_config.get('starttls', True):
+        with phase_timer(metrics, 'tls'):
+            server.starttls()
+    # Messages go out as several writes (envelope, DATA chunks, terminator);
+    # without this Nagle's algorithm holds each small write for a delayed ACK
+    server.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    with phase_timer(metrics, 'auth'):
+        server.login(smtp_config['sender_email'], smtp_config['password'])
+    return server
+
+
+class SMTPSession:
+    """
+    Authenticated SMTP connection reused for many messages.
+
+    The connection is opened lazily, recycled after `max_messages` messages
+    and transparently re-established when the server hangs up or answers 421.
+    Use it as a context manager so the connection is always closed. With
+    `metrics`, connection setup and every transaction are timed and counted.
+    """
+
+    def __init__(self, smtp_config, max_messages=None, metrics=None):
+        self.smtp_config = smtp_config
+        self.max_messages = max_messages or smtp_config.get(
+            'max_messages_per_connection') or DEFAULT_MESSAGES_PER_CONNECTION
+        self.metrics = metrics
+        self.server = None
+        self.messages_on_connection = 0
+        self.reconnects = 0
+        self.deferrals = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        """
+        Open and authenticate the connection if it is not already open
+        """
+        if self.server is None:
+            self.server = open_smtp_connection(self.smtp_config, self.metrics)
+            self.messages_on_connection = 0
+            if self.metrics is not None:
+                self.metrics.count_connection()
+        return self.server
+
+    def close(self):
+        """
+        Politely end the current connection, ignoring a server that already left
+        """
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        finally:
+            self.server = None
+
+    def reconnect(self):
+        """
+        Drop the current connection and authenticate a fresh one
+        """
+        self.close()
+        self.reconnects += 1
+        server = self.connect()
+        if self.metrics is not None:
+            self.metrics.count_reconnect()
+        return server
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """
+        Send an email.message.Message, retrying once on a dropped connection
+        """
+        return self._send(lambda server: server.send_message(
+            msg, from_addr=from_addr, to_addrs=to_addrs))
+
+    def sendmail(self, from_addr, to_addrs, chunks):
+        """
+        Send pre-encoded DATA chunks (see MessageSkeleton), retrying once on a
+        dropped connection
+        """
+        return self._send(lambda server: send_data_chunks(
+            server, from_addr, to_addrs, chunks))
+
+    def _send(self, send):
+        if self.server is not None and self.messages_on_connection >= self.max_messages:
+            self.reconnect()
+        server = self.connect()
+        try:
+            result = self._transaction(send, server)
+        except smtplib.SMTPServerDisconnected:
+            result = self._transaction(send, self.reconnect())
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code != 421:
+                raise
+            self.deferrals += 1
+            result = self._transaction(send, self.reconnect())
+        self.messages_on_connection += 1
+        return result
+
+    def _transaction(self, send, server):
+        with phase_timer(self.metrics, 'data'):
+            return send(server)
+
+
+def smtp_reply(error):
+    """
+    (code, text) of the SMTP reply carried by an smtplib exception, or
+    (None, None) for errors that never got a reply (timeouts, dropped
+    connections, bad input)
+    """
+    if isinstance(error, smtplib.SMTPResponseException):
+        code, text = error.smtp_code, error.smtp_error
+    elif isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code, text = next(iter(error.recipients.values()))
+    else:
+        return None, None
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', 'replace')
+    return code, text
+
+
+def describe_failure(error):
+    """
+    Structured form of a send error: SMTP code, enhanced status, exception
+    class, the error text, and whether it is transient (worth retrying
+    later) or permanent.
+
+    The enhanced status class decides when there is one (4.x.x transient,
+    5.x.x permanent), then the reply code (4xx / 5xx). Errors without a
+    reply are transient for network trouble and permanent otherwise.
+    """
+    code, text = smtp_reply(error)
+    match = ENHANCED_STATUS_PATTERN.match(text or '')
+    enhanced_status = match.group(1) if match else None
+    if enhanced_status is not None:
+        transient = enhanced_status.startswith('4')
+    elif code is not None:
+        transient = 400 <= code < 500
+    else:
+        transient = isinstance(error, smtplib.SMTPServerDisconnected) or (
+            isinstance(error, TRANSIENT_ERRORS) and not isinstance(error, PERMANENT_ERRORS))
+    return {
+        'code': code,
+        'enhanced_status': enhanced_status,
+        'error': type(error).__name__,
+        # The server's reply text repeats across recipients; str() of a refusal names the address
+        'detail': text if text else str(error),
+        'transient': transient,
+    }
+
+
+def message_to_wire(msg):
+    """
+    Flatten a MIME message to CRLF bytes
+    """
+    buffer = BytesIO()
+    BytesGenerator(buffer, policy=msg.policy.clone(
+        linesep='\r\n')).flatten(msg)
+    return buffer.getvalue()
+
+
+def prepare_data(data):
+    """
+    Make message bytes safe for the DATA phase: CRLF line endings, leading
+    dots doubled and a final CRLF. The end-of-data marker is not included.
+    """
+    data = _BARE_EOL.sub(b'\r\n', data)
+    if data.startswith(b'.'):
+        data = b'.' + data
+    data = data.replace(b'\r\n.', b'\r\n..')
+    if not data.endswith(b'\r\n'):
+        data += b'\r\n'
+    return data
+
+
+def send_data_chunks(server, from_addr, to_addrs, chunks):
+    """
+    Run MAIL/RCPT/DATA on an smtplib connection, writing `chunks` as-is.
+
+    Unlike smtplib's sendmail this never joins or rescans the message, so
+    large shared chunks (encoded attachments) go to the socket untouched.
+    The chunks must already be prepared with prepare_data.
+    """
+    server.ehlo_or_helo_if_needed()
+    code, resp = server.mail(from_addr)
+    if code != 250:
+        _reset(server, code)
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+    refused = {}
+    for addr in to_addrs:
+        code, resp = server.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+    if len(refused) == len(to_addrs):
+        _reset(server, None)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    server.putcmd('data')
+    code, resp = server.getreply()
+    if code != 354:
+        _reset(server, code)
+        raise smtplib.SMTPDataError(code, resp)
+    for chunk in chunks:
+        server.send(chunk)
+    server.send(b'.\r\n')
+    code, resp = server.getreply()
+    if code != 250:
+        _reset(server, code)
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+def _reset(server, code):
+    # After a 421 the server is closing the link; RSET would only fail
+    if code == 421:
+        server.close()
+        return
+    try:
+        server.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
 
 
 def markdown_to_html(markdown_text):
@@ -26,63 +318,313 @@ def markdown_to_html(markdown_text):
     return styled_html
 
 
-def send_single_email(recipient_name, recipient_email, subject, body, smtp_config, attachments=None, format_type='markdown'):
+def template_fields(body):
+    """
+    Names of the {placeholders} used in a template, in order of first use
     """
-    Send a single personalized email using SMTP with support for multiple attachments
+    return list(dict.fromkeys(PLACEHOLDER_PATTERN.findall(body)))
 
-    Args:
-        attachments: List of Streamlit UploadedFile objects
+
+def fill_placeholders(text, fields):
     """
-    try:
-        # Create message
+    Replace known {placeholders} in plain text, leaving unknown ones untouched
+    """
+    return PLACEHOLDER_PATTERN.sub(
+        lambda m: str(fields[m.group(1)]) if m.group(1) in fields else m.group(0), text)
+
+
+def personalization(recipient_name, recipient_email, fields=None):
+    """
+    Template values for one recipient: first_name, email and any mapped fields
+    """
+    values = dict(fields) if fields else {}
+    values['first_name'] = recipient_name
+    values['email'] = recipient_email
+    return values
+
+
+class CompiledTemplate:
+    """
+    Email body rendered to HTML once per campaign.
+
+    Placeholders are swapped for sentinels before Markdown runs, so the
+    rendered HTML can be split into literal chunks and variable slots.
+    `render` then only joins the chunks with HTML-escaped recipient values.
+    If Markdown swallows or duplicates a sentinel (for example inside a URL
+    it rewrites), a placeholder sits inside a <...> autolink (whose link
+    depends on the value), or rendering sample values the fast way differs
+    from rendering them through Markdown, the template falls back to
+    rendering per recipient.
+    """
+
+    def __init__(self, body, format_type='markdown'):
+        self.body = body
+        self.format_type = format_type
+        names = []
+
+        def mark(match):
+            names.append(match.group(1))
+            return _SENTINEL.format(len(names) - 1)
+
+        rendered = self._to_html(PLACEHOLDER_PATTERN.sub(mark, body))
+        pieces = _SENTINEL_PATTERN.split(rendered)
+        slots = [int(i) for i in pieces[1::2]]
+        self.chunks = None
+        self.slots = names
+        if sorted(slots) == list(range(len(names))) and not (
+                format_type == 'markdown' and _AUTOLINK_PLACEHOLDER.search(body)):
+            self.chunks = pieces[::2]
+            self.slots = [names[i] for i in slots]
+            probe = {name: f"probe{i}@example.com" for i, name in enumerate(names)}
+            if self.render(probe) != self._to_html(fill_placeholders(body, probe)):
+                self.chunks = None
+                self.slots = names
+
+    def _to_html(self, text):
+        if self.format_type == 'markdown':
+            return markdown_to_html(text)
+        return format_email_body(text, 'html')
+
+    def render(self, fields):
+        """
+        Personalized HTML for one recipient; unknown placeholders are kept as-is
+        """
+        if self.chunks is None:
+            return self._to_html(fill_placeholders(self.body, fields))
+
+        parts = [self.chunks[0]]
+        for name, chunk in zip(self.slots, self.chunks[1:]):
+            if name in fields:
+                parts.append(html.escape(str(fields[name])))
+            else:
+                parts.append('{' + name + '}')
+            parts.append(chunk)
+        return ''.join(parts)
+
+
+def compile_template(body, format_type='markdown'):
+    """
+    Return the CompiledTemplate for `body`, reusing it while the text is unchanged
+    """
+    key = (hashlib.sha256(body.encode('utf-8')).hexdigest(), format_type)
+    with _template_cache_lock:
+        template = _template_cache.get(key)
+        if template is not None:
+            _template_cache.move_to_end(key)
+            return template
+
+    template = CompiledTemplate(body, format_type)
+    with _template_cache_lock:
+        _template_cache[key] = template
+        while len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return template
+
+
+class EncodedAttachment:
+    """
+    An uploaded file read and base64-encoded once.
+
+    `part` is an immutable MIMEApplication that every message of a campaign
+    attaches by reference, so the encoded payload exists in memory only once.
+    """
+
+    def __init__(self, name, data):
+        self.name = name
+        self.size = len(data)
+        self.part = MIMEApplication(data, Name=name)
+        self.part['Content-Disposition'] = f'attachment; filename="{name}"'
+        self.encoded_size = len(self.part.get_payload())
+
+
+def encode_attachments(attachments):
+    """
+    Encode uploaded files once, reusing earlier encodings of the same content
+
+    Accepts Streamlit UploadedFile objects (or anything with `name` and
+    `getvalue()`); EncodedAttachment items are passed through untouched.
+    """
+    encoded = []
+    for attachment in attachments or []:
+        if attachment is None:
+            continue
+        if isinstance(attachment, EncodedAttachment):
+            encoded.append(attachment)
+            continue
+
+        # getvalue() leaves the stream position alone, so concurrent
+        # senders can share the same upload
+        data = attachment.getvalue()
+        key = (hashlib.sha256(data).hexdigest(), attachment.name)
+        with _attachment_cache_lock:
+            item = _attachment_cache.get(key)
+            if item is not None:
+                _attachment_cache.move_to_end(key)
+        if item is None:
+            item = EncodedAttachment(attachment.name, data)
+            with _attachment_cache_lock:
+                _attachment_cache[key] = item
+                while len(_attachment_cache) > 1 and attachment_cache_size() > ATTACHMENT_CACHE_MAX_BYTES:
+                    _attachment_cache.popitem(last=False)
+        encoded.append(item)
+    return encoded
+
+
+def attachment_cache_size():
+    """
+    Bytes of encoded attachment payload currently held in memory
+    """
+    return sum(item.encoded_size for item in list(_attachment_cache.values()))
+
+
+class MessageSkeleton:
+    """
+    Wire bytes of a campaign message with only the per-recipient parts open.
+
+    From, Subject, the MIME boundaries and the encoded attachments are
+    serialized once. `chunks` then splices To, Date, Message-ID and the
+    base64 HTML body into the precomputed gaps and returns DATA-ready chunks
+    that share the invariant buffers instead of copying them.
+    """
+
+    def __init__(self, subject, smtp_config, attachments=None):
+        self.sender_email = smtp_config['sender_email']
+        self.domain = self.sender_email.rpartition('@')[2] or None
+        self.attachments = encode_attachments(attachments)
+
+        marker = uuid.uuid4().hex
+        fields = ['to', 'date', 'message_id', 'body']
+        markers = {name: f'skeleton-{marker}-{name}' for name in fields}
+
         msg = MIMEMultipart('alternative')
         msg['From'] = formataddr(
             (smtp_config['sender_name'], smtp_config['sender_email']))
-        msg['To'] = recipient_email
+        msg['To'] = markers['to']
         msg['Subject'] = subject
+        msg['Date'] = markers['date']
+        msg['Message-ID'] = markers['message_id']
+
+        html_part = MIMEBase('text', 'html', charset='utf-8')
+        html_part['Content-Transfer-Encoding'] = 'base64'
+        html_part.set_payload(markers['body'])
+        msg.attach(html_part)
+        for attachment in self.attachments:
+            msg.attach(attachment.part)
+
+        wire = prepare_data(message_to_wire(msg))
+        pattern = re.compile(
+            '|'.join(re.escape(markers[name]) for name in fields).encode('ascii'))
+        pieces = pattern.split(wire)
+        found = [m.group().decode('ascii').rsplit('-', 1)[1]
+                 for m in pattern.finditer(wire)]
+        # Each marker must appear once, in header/body order
+        if found != fields:
+            raise ValueError("Could not locate message skeleton markers")
+        self.pieces = pieces
+
+    def chunks(self, recipient_email, html_content):
+        """
+        DATA chunks for one recipient (see send_data_chunks)
+        """
+        to = recipient_email.replace('\r', '').replace('\n', '')
+        if not to.isascii():
+            to = Header(to, 'utf-8').encode()
+        body = base64.encodebytes(html_content.encode('utf-8'))
+        # Drop the final newline; the skeleton already ends the body line
+        body = body.replace(b'\n', b'\r\n')[:-2]
+        head = b''.join([
+            self.pieces[0], to.encode('ascii'),
+            self.pieces[1], formatdate(localtime=True).encode('ascii'),
+            self.pieces[2], make_msgid(domain=self.domain).encode('ascii'),
+            self.pieces[3], body,
+        ])
+        return [head, self.pieces[4]]
+
+
+def build_email_message(recipient_name, recipient_email, subject, body, smtp_config, attachments=None, format_type='markdown', fields=None):
+    """
+    Build the personalized MIME message for one recipient
 
-        # Personalize the body
-        personalized_body = body.replace('{first_name}', recipient_name)
+    Args:
+        attachments: List of Streamlit UploadedFile objects, or the
+            EncodedAttachment list from encode_attachments to skip re-encoding
+        fields: Extra template values such as {company} from the column mapping
+    """
+    # Create message
+    msg = MIMEMultipart('alternative')
+    msg['From'] = formataddr(
+        (smtp_config['sender_name'], smtp_config['sender_email']))
+    msg['To'] = recipient_email
+    msg['Subject'] = subject
 
-        if format_type == 'markdown':
-            # Convert Markdown to HTML
-            html_content = markdown_to_html(personalized_body)
-            # plain_text = personalized_body
-        else:
-            html_content = format_email_body(personalized_body, 'html')
-            # plain_text = format_email_body(personalized_body, 'plain')
+    # Personalize the body from the template compiled once per campaign
+    html_content = compile_template(body, format_type).render(
+        personalization(recipient_name, recipient_email, fields))
 
-        # Attach both HTML and plain text versions
-        # msg.attach(MIMEText(plain_text, 'plain'))
-        msg.attach(MIMEText(html_content, 'html'))
+    # Attach both HTML and plain text versions
+    # msg.attach(MIMEText(plain_text, 'plain'))
+    msg.attach(MIMEText(html_content, 'html'))
 
-        # Add file attachments if provided :cite[1]:cite[2]
-        if attachments:
-            for attachment in attachments:
-                if attachment is not None:
-                    # Read file data and attach to email
-                    file_data = attachment.read()
-                    part = MIMEApplication(file_data, Name=attachment.name)
-                    part['Content-Disposition'] = f'attachment; filename="{attachment.name}"'
-                    msg.attach(part)
-                    # Reset stream position for potential reuse
-                    attachment.seek(0)
+    # Add file attachments if provided; encoded parts are shared, not copied
+    for attachment in encode_attachments(attachments):
+        msg.attach(attachment.part)
 
-        # Connect to SMTP server and send
-        if smtp_config['port'] == 465:
-            server = smtplib.SMTP_SSL(smtp_config['host'], smtp_config['port'])
-        else:
-            server = smtplib.SMTP(smtp_config['host'], smtp_config['port'])
-            server.starttls()
+    return msg
 
-        server.login(smtp_config['sender_email'], smtp_config['password'])
-        server.send_message(msg)
-        server.quit()
 
-        return True, f"✅ Email with {len(attachments) if attachments else 0} attachment(s) sent to {recipient_name} ({recipient_email})"
+def send_single_email(recipient_name, recipient_email, subject, body, smtp_config, attachments=None, format_type='markdown', session=None, skeleton=None, fields=None, metrics=None):
+    """
+    Send a single personalized email using SMTP with support for multiple attachments.
+    Returns (success, message); see deliver_email for the arguments.
+    """
+    success, message, _ = deliver_email(recipient_name, recipient_email, subject, body, smtp_config,
+                                        attachments, format_type, session, skeleton, fields, metrics)
+    return success, message
+
+
+def deliver_email(recipient_name, recipient_email, subject, body, smtp_config, attachments=None, format_type='markdown', session=None, skeleton=None, fields=None, metrics=None):
+    """
+    send_single_email that also describes what went wrong:
+    (success, message, failure), where failure is None on success and a
+    describe_failure dict otherwise
+
+    Args:
+        attachments: List of Streamlit UploadedFile objects
+        session: Optional SMTPSession to reuse across a campaign. When omitted
+            a connection is opened and closed just for this message.
+        skeleton: Optional MessageSkeleton built once per campaign; its
+            subject and attachments are used instead of rebuilding the MIME tree.
+        fields: Extra template values such as {company} from the column mapping
+        metrics: Optional DeliveryMetrics for build time, outcome and size;
+            the session records the connection and DATA phases
+    """
+    try:
+        with phase_timer(metrics, 'build'):
+            if skeleton is not None:
+                html_content = compile_template(body, format_type).render(
+                    personalization(recipient_name, recipient_email, fields))
+                chunks = skeleton.chunks(recipient_email, html_content)
+            else:
+                # Flattened once here so its size is known, as with a skeleton
+                msg = build_email_message(recipient_name, recipient_email, subject,
+                                          body, smtp_config, attachments, format_type, fields)
+                chunks = [prepare_data(message_to_wire(msg))]
+
+        # Send over the campaign session, or a one-off connection if none
+        if session is not None:
+            session.sendmail(smtp_config['sender_email'], [recipient_email], chunks)
+        else:
+            with SMTPSession(smtp_config, metrics=metrics) as one_off:
+                one_off.sendmail(smtp_config['sender_email'], [recipient_email], chunks)
+
+        if metrics is not None:
+            metrics.count_message(True, sum(len(chunk) for chunk in chunks))
+        return True, f"✅ Email with {len(attachments) if attachments else 0} attachment(s) sent to {recipient_name} ({recipient_email})", None
 
     except Exception as e:
-        return False, f"❌ Failed to send to {recipient_name}: {str(e)}"
+        if metrics is not None:
+            metrics.count_message(False)
+        return False, f"❌ Failed to send to {recipient_name}: {str(e)}", describe_failure(e)
 
 
 def send_single_email1(recipient_name, recipient_email, subject, body, smtp_config, format_type='markdown'):
@@ -199,14 +741,8 @@ def test_smtp_connection(smtp_config):
     Test SMTP connection with provided credentials
     """
     try:
-        if smtp_config['port'] == 465:
-            server = smtplib.SMTP_SSL(smtp_config['host'], smtp_config['port'])
-        else:
-            server = smtplib.SMTP(smtp_config['host'], smtp_config['port'])
-            server.starttls()
-
-        server.login(smtp_config['sender_email'], smtp_config['password'])
-        server.quit()
+        with SMTPSession(smtp_config) as session:
+            session.connect()
         return True, "✅ SMTP connection successful!"
 
     except Exception as e:
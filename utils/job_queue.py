@@ -0,0 +1,355 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+# Campaign queue shared by the Streamlit app and worker.py processes
+DEFAULT_DB_PATH = os.environ.get(
+    'EMAIL_JOBS_DB', os.path.join('campaign_data', 'jobs.sqlite3'))
+
+# A running job whose worker has not checked in for this long is re-queued
+STALE_JOB_SECONDS = 120
+
+# 'staging' jobs are still being written by submit_job; workers skip them
+JOB_STATUSES = ('staging', 'queued', 'running', 'done', 'failed', 'cancelled')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    name TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat REAL,
+    worker TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS job_recipients (
+    job_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    success INTEGER,
+    message TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS job_attachments (
+    job_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+def connect(db_path=DEFAULT_DB_PATH, check_same_thread=True):
+    """
+    Open the queue database, creating it (owner-only permissions) if needed
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # The payload holds the SMTP passwords until the job finishes. Creating
+    # the file owner-only before SQLite opens it matters: the -wal and -shm
+    # files SQLite adds get the database file's permissions.
+    try:
+        os.close(os.open(db_path, os.O_CREAT | os.O_WRONLY, 0o600))
+        for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+            if os.path.exists(path):
+                os.chmod(path, 0o600)
+    except OSError:
+        pass
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None,
+                           check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class StoredAttachment:
+    """
+    Attachment read back from the queue; quacks like a Streamlit UploadedFile
+    """
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.size = len(data)
+
+    def getvalue(self):
+        return self.data
+
+
+def submit_job(recipients, subject, body, smtp_config, attachments=None, options=None,
+               name=None, db_path=DEFAULT_DB_PATH, batch_size=10000):
+    """
+    Queue a campaign for a worker process and return its job id.
+
+    `recipients` is any iterable of recipient dicts (a SendPlan, or the
+    streaming generator); it is written in batches so it is never held in
+    memory as a whole. `options` are passed to the send engine
+    (engine, max_rate, max_concurrency, format_type; 'senders' is a list of
+    smtp_config dicts for a SenderPool).
+    """
+    payload = json.dumps({
+        'subject': subject,
+        'body': body,
+        'smtp_config': smtp_config,
+        'options': options or {},
+    })
+    with closing(connect(db_path)) as conn:
+        # Recipients go in as short committed batches, so workers recording
+        # outcomes never wait behind a long submission; workers only see
+        # the job once it leaves 'staging'
+        job_id = conn.execute(
+            "INSERT INTO jobs (status, name, created_at, heartbeat, payload) VALUES ('staging', ?, ?, ?, ?)",
+            (name, time.time(), time.time(), payload)).lastrowid
+        try:
+            total = 0
+            batch = []
+            for idx, recipient in enumerate(recipients):
+                fields = {key: value for key, value in recipient.items()
+                          if key != 'email'}
+                batch.append((job_id, idx, recipient['email'],
+                              json.dumps(fields, default=str)))
+                if len(batch) >= batch_size:
+                    total += _stage_recipients(conn, job_id, batch)
+                    batch = []
+            total += _stage_recipients(conn, job_id, batch)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for attachment in attachments or []:
+                    if attachment is not None:
+                        conn.execute("INSERT INTO job_attachments (job_id, name, data) VALUES (?, ?, ?)",
+                                     (job_id, attachment.name, attachment.getvalue()))
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', total = ? WHERE id = ?", (total, job_id))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except BaseException:
+            _discard_job(conn, job_id)
+            raise
+    return job_id
+
+
+def _stage_recipients(conn, job_id, batch):
+    """
+    Write one batch of a staging job's recipients in its own transaction
+    """
+    if not batch:
+        return 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO job_recipients (job_id, idx, email, fields) VALUES (?, ?, ?, ?)", batch)
+        conn.execute(
+            "UPDATE jobs SET total = total + ?, heartbeat = ? WHERE id = ?",
+            (len(batch), time.time(), job_id))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(batch)
+
+
+def _discard_job(conn, job_id):
+    """
+    Remove a job that never finished staging, with its recipients
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM job_recipients WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM job_attachments WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def claim_next_job(conn, worker):
+    """
+    Atomically move the oldest queued job to 'running' for `worker`.
+    Returns the job row or None.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND cancel_requested = 0 ORDER BY id LIMIT 1").fetchone()
+        if row is not None:
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = COALESCE(started_at, ?), heartbeat = ? WHERE id = ?",
+                (worker, now, now, row['id']))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+
+def load_job(conn, job_id):
+    """
+    Payload dict and StoredAttachment list for a job
+    """
+    row = conn.execute(
+        "SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    attachments = [StoredAttachment(r['name'], r['data']) for r in conn.execute(
+        "SELECT name, data FROM job_attachments WHERE job_id = ? ORDER BY rowid", (job_id,))]
+    return json.loads(row['payload']), attachments
+
+
+def iter_pending_recipients(job_id, order, db_path=DEFAULT_DB_PATH):
+    """
+    Yield recipient dicts that have no recorded outcome yet, in list order.
+    Each yielded recipient's idx is appended to `order`, so the engine's
+    running index can be mapped back to the stored row.
+
+    Uses its own connection because send engines pull recipients from
+    their worker threads.
+    """
+    with closing(connect(db_path, check_same_thread=False)) as conn:
+        cursor = conn.execute(
+            "SELECT idx, email, fields FROM job_recipients WHERE job_id = ? AND success IS NULL ORDER BY idx",
+            (job_id,))
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                recipient = json.loads(row['fields'])
+                recipient['email'] = row['email']
+                order.append(row['idx'])
+                yield recipient
+
+
+def record_results(conn, job_id, outcomes):
+    """
+    Store a batch of (idx, success, message) outcomes, bump the job's
+    counters and heartbeat. Returns True if cancellation was requested.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "UPDATE job_recipients SET success = ?, message = ? WHERE job_id = ? AND idx = ?",
+            [(int(success), message, job_id, idx) for idx, success, message in outcomes])
+        sent = sum(1 for _, success, _ in outcomes if success)
+        conn.execute(
+            "UPDATE jobs SET sent = sent + ?, failed = failed + ?, heartbeat = ? WHERE id = ?",
+            (sent, len(outcomes) - sent, time.time(), job_id))
+        cancel = conn.execute(
+            "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return bool(cancel)
+
+
+def finish_job(conn, job_id, status, error=None):
+    """
+    Mark a job done/failed/cancelled and drop the stored SMTP passwords
+    """
+    payload = json.loads(conn.execute(
+        "SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+    payload['smtp_config'].pop('password', None)
+    for sender in payload['options'].get('senders') or []:
+        sender.pop('password', None)
+    conn.execute(
+        "UPDATE jobs SET status = ?, error = ?, finished_at = ?, payload = ? WHERE id = ?",
+        (status, error, time.time(), json.dumps(payload), job_id))
+
+
+def cancel_job(job_id, db_path=DEFAULT_DB_PATH):
+    """
+    Ask for a job to stop; queued jobs are cancelled immediately
+    """
+    with closing(connect(db_path)) as conn:
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        row = conn.execute(
+            "SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is not None and row['status'] == 'queued':
+            finish_job(conn, job_id, 'cancelled')
+
+
+def requeue_stale_jobs(conn, stale_seconds=STALE_JOB_SECONDS):
+    """
+    Put running jobs whose worker stopped reporting back in the queue.
+    Recipients that already have an outcome are not sent again. Jobs left
+    in 'staging' by a submitter that died are discarded.
+    """
+    abandoned = conn.execute(
+        "SELECT id FROM jobs WHERE status = 'staging' AND heartbeat < ?",
+        (time.time() - stale_seconds,)).fetchall()
+    for row in abandoned:
+        _discard_job(conn, row['id'])
+    return conn.execute(
+        "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat < ?",
+        (time.time() - stale_seconds,)).rowcount
+
+
+def touch_job(conn, job_id, worker=None):
+    """
+    Show that a running job is alive when it has no outcomes to record,
+    e.g. while it waits for sender quota. Returns True if cancellation was
+    requested.
+    """
+    conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+    if worker is not None:
+        worker_heartbeat(conn, worker)
+    return bool(conn.execute(
+        "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+
+
+def worker_heartbeat(conn, worker):
+    conn.execute(
+        "INSERT INTO workers (name, heartbeat) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET heartbeat = excluded.heartbeat",
+        (worker, time.time()))
+
+
+def active_workers(db_path=DEFAULT_DB_PATH, within_seconds=30):
+    """
+    Names of workers that checked in recently
+    """
+    with closing(connect(db_path)) as conn:
+        return [row['name'] for row in conn.execute(
+            "SELECT name FROM workers WHERE heartbeat >= ? ORDER BY name",
+            (time.time() - within_seconds,))]
+
+
+def list_jobs(db_path=DEFAULT_DB_PATH, limit=20):
+    """
+    Most recent jobs as dicts (without payloads), newest first
+    """
+    with closing(connect(db_path)) as conn:
+        return [dict(row) for row in conn.execute(
+            "SELECT id, status, name, created_at, started_at, finished_at, total, sent, failed, "
+            "cancel_requested, error FROM jobs ORDER BY id DESC LIMIT ?",
+            (limit,))]
+
+
+def job_failures(job_id, db_path=DEFAULT_DB_PATH, limit=100):
+    """
+    First `limit` failed recipients of a job as result dicts
+    """
+    with closing(connect(db_path)) as conn:
+        rows = conn.execute(
+            "SELECT email, fields, message FROM job_recipients WHERE job_id = ? AND success = 0 ORDER BY idx LIMIT ?",
+            (job_id, limit)).fetchall()
+    return [{'name': json.loads(row['fields']).get('first_name', ''), 'email': row['email'],
+             'success': False, 'message': row['message']} for row in rows]
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+
+from utils.delivery_journal import DeliveryJournal
+from utils.results_store import ResultsStore
+
+# Results counted in the rolling throughput and error rate
+ROLLING_WINDOW_SECONDS = 30.0
+
+
+class LiveCampaign:
+    """
+    A campaign sending from a background thread while the page polls it.
+
+    `campaign` is the (index, result) iterator of iter_campaign or
+    iter_campaign_async. Every result goes into a ResultsStore and the
+    delivery journal for `journal_campaign`. The sending thread never
+    touches Streamlit, so the UI is redrawn on its own schedule from
+    progress() instead of once per message.
+
+    With `metrics`, the capture started on it is stopped, the Prometheus
+    file written and any profile saved when the campaign ends. `senders`
+    is the SenderPool the campaign sends through, kept for its per-account
+    summary.
+    """
+
+    def __init__(self, campaign, total, journal_campaign, metrics=None, metrics_file=None,
+                 senders=None):
+        self.campaign = campaign
+        self.total = max(1, total)
+        self.journal_campaign = journal_campaign
+        self.metrics = metrics
+        self.metrics_file = metrics_file
+        self.senders = senders
+        self.store = ResultsStore()
+        self.lock = threading.Lock()
+        # (completion time, success) of recent results, oldest first
+        self.recent = deque()
+        self.recent_failures = 0
+        self.last_name = None
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.capture_files = []
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started = time.monotonic()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Ask the campaign to end once the messages already in flight are done
+        """
+        self.stopping.set()
+        if self.senders is not None:
+            # A campaign waiting for sender quota has no result to stop at
+            self.senders.cancel()
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    def _trim(self, now):
+        while self.recent and now - self.recent[0][0] > ROLLING_WINDOW_SECONDS:
+            _, success = self.recent.popleft()
+            self.recent_failures -= not success
+
+    def _run(self):
+        try:
+            with DeliveryJournal(self.journal_campaign) as journal:
+                for index, result in self.campaign:
+                    journal.append(result['email'], result['success'], result['message'],
+                                   permanent=result.get('transient') is False)
+                    now = time.monotonic()
+                    with self.lock:
+                        self.store.append(index, result)
+                        self.recent.append((now, result['success']))
+                        self.recent_failures += not result['success']
+                        self._trim(now)
+                        self.last_name = result['name']
+                    if self.stopping.is_set():
+                        break
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.campaign.close()
+            if self.metrics is not None:
+                self.metrics.stop_capture()
+                if self.metrics_file:
+                    self.metrics.write_prometheus(self.metrics_file)
+                self.capture_files = self.metrics.save_capture(
+                    f"campaign-{self.journal_campaign}-{int(time.time())}")
+            self.finished = time.monotonic()
+
+    def progress(self):
+        """
+        Counts so far, throughput and error rate over the last
+        ROLLING_WINDOW_SECONDS, and the estimated seconds left
+        """
+        now = self.finished or time.monotonic()
+        with self.lock:
+            self._trim(now)
+            counts = self.store.counts()
+            recent = len(self.recent)
+            recent_failures = self.recent_failures
+            last_name = self.last_name
+        window = min(ROLLING_WINDOW_SECONDS, max(now - self.started, 1e-3))
+        throughput = recent / window
+        remaining = max(0, self.total - counts['total'])
+        return dict(
+            counts,
+            last_name=last_name,
+            elapsed_s=now - self.started,
+            throughput=throughput,
+            error_rate=recent_failures / recent if recent else 0.0,
+            eta_s=remaining / throughput if throughput and self.running else None,
+        )
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+try:
+    import dns.resolver
+    HAS_DNS = True
+except ImportError:
+    HAS_DNS = False
+
+MX_CACHE_SIZE = 10000
+
+
+# Second-level labels that country-code domains register names under
+# (example.co.uk, example.com.au, example.ne.jp); not a full public suffix
+# list, but it covers how mail providers are actually named
+COUNTRY_SECOND_LEVELS = frozenset({
+    'ac', 'co', 'com', 'edu', 'gen', 'go', 'gob', 'gov', 'gv', 'ltd', 'me',
+    'ne', 'net', 'nic', 'nom', 'or', 'org', 'plc', 'sch',
+})
+
+
+def provider_key(host):
+    """
+    Collapse a mail host to the provider that runs it, i.e. its registrable
+    domain: 'alt1.gmail-smtp-in.l.google.com' -> 'google.com',
+    'mx1.example.co.uk' -> 'example.co.uk'
+    """
+    labels = host.rstrip('.').lower().split('.')
+    size = 2
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in COUNTRY_SECOND_LEVELS:
+        size = 3
+    return '.'.join(labels[-size:])
+
+
+def dns_mx_lookup(domain):
+    """
+    MX hosts for a domain, most preferred first (needs dnspython)
+    """
+    answers = dns.resolver.resolve(domain, 'MX', lifetime=5)
+    return [str(record.exchange) for record in sorted(answers, key=lambda r: r.preference)]
+
+
+class MXResolver:
+    """
+    Maps a recipient domain to the receiving provider it is delivered to.
+
+    Domains hosted by the same provider (gmail.com and Google Workspace
+    domains, say) share one key, so per-domain limits apply to the
+    provider as a whole. `lookup(domain)` returns MX hosts, most preferred
+    first; it defaults to a DNS query when dnspython is installed. Without
+    a lookup, or when it fails, the domain itself is the key. `overrides`
+    pins domains to keys without any lookup (handy for local testing).
+    Results are cached, least recently used first out.
+    """
+
+    def __init__(self, lookup=None, overrides=None, cache_size=MX_CACHE_SIZE):
+        self.lookup = lookup if lookup is not None else (dns_mx_lookup if HAS_DNS else None)
+        self.overrides = dict(overrides or {})
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __call__(self, domain):
+        if domain in self.overrides:
+            return self.overrides[domain]
+        with self.lock:
+            if domain in self.cache:
+                self.cache.move_to_end(domain)
+                return self.cache[domain]
+        key = domain
+        if self.lookup is not None and domain:
+            try:
+                hosts = self.lookup(domain)
+                if hosts:
+                    key = provider_key(hosts[0])
+            except Exception:
+                pass
+        with self.lock:
+            self.cache[domain] = key
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return key
@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Messages sent per account, shared by the app and every worker
+QUOTA_DB_PATH = os.environ.get(
+    'EMAIL_QUOTA_DB', os.path.join('campaign_data', 'quota.sqlite3'))
+
+# Rolling windows quotas are counted over
+DAY_SECONDS = 24 * 3600
+HOUR_SECONDS = 3600
+
+# Sends are counted per minute, so a window frees up a minute at a time
+SLOT_SECONDS = 60
+
+# Sends are written to the database at least this often
+LEDGER_FLUSH_RECORDS = 100
+LEDGER_FLUSH_SECONDS = 1.0
+
+# Daily sending limits of the free tiers of the sidebar's providers, used
+# when an account sets no quota of its own
+PROVIDER_DAILY_QUOTAS = {
+    'smtp.gmail.com': 500,
+    'smtp.mail.yahoo.com': 500,
+    'smtp.office365.com': 10000,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    account TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (account, slot)
+);
+"""
+
+
+def account_quotas(smtp_config):
+    """
+    (daily, hourly) message quota of an account; None where there is no limit
+    """
+    daily = smtp_config.get('daily_quota') or PROVIDER_DAILY_QUOTAS.get(smtp_config['host'])
+    return daily, smtp_config.get('hourly_quota') or None
+
+
+class QuotaLedger:
+    """
+    Persistent count of the messages each account sent, per minute, over
+    the last day.
+
+    Counts live in a small SQLite database so that every process sending
+    as the same account (the app, any number of workers) sees the same
+    totals. Each process keeps the last day in memory, adds its own sends
+    straight away and exchanges them with the database every
+    LEDGER_FLUSH_SECONDS, so recording a send costs no disk write.
+    Thread-safe.
+    """
+
+    def __init__(self, db_path=QUOTA_DB_PATH):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.pending = {}
+        self.pending_records = 0
+        self.synced = 0.0
+        with self.lock:
+            self._sync(time.time())
+
+    def close(self):
+        with self.lock:
+            self._sync(time.time())
+            self.conn.close()
+
+    def _sync(self, now):
+        """
+        Write our pending sends and reload everyone's counts for the last day
+        """
+        oldest = int((now - DAY_SECONDS) // SLOT_SECONDS)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "INSERT INTO sends (account, slot, count) VALUES (?, ?, ?) "
+                "ON CONFLICT(account, slot) DO UPDATE SET count = count + excluded.count",
+                [(account, slot, count) for (account, slot), count in self.pending.items()])
+            self.conn.execute("DELETE FROM sends WHERE slot < ?", (oldest,))
+            rows = self.conn.execute(
+                "SELECT account, slot, count FROM sends ORDER BY slot").fetchall()
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.counts = {}
+        for account, slot, count in rows:
+            self.counts.setdefault(account, {})[slot] = count
+        self.pending = {}
+        self.pending_records = 0
+        self.synced = now
+
+    def flush(self):
+        with self.lock:
+            self._sync(time.time())
+
+    def record(self, account, count=1, now=None):
+        """
+        Count `count` messages sent by `account` (any stable name) at `now`
+        """
+        clock = time.time()
+        slot = int((clock if now is None else now) // SLOT_SECONDS)
+        with self.lock:
+            slots = self.counts.setdefault(account, {})
+            slots[slot] = slots.get(slot, 0) + count
+            self.pending[account, slot] = self.pending.get((account, slot), 0) + count
+            self.pending_records += 1
+            if self.pending_records >= LEDGER_FLUSH_RECORDS or clock - self.synced >= LEDGER_FLUSH_SECONDS:
+                self._sync(clock)
+
+    def _refresh(self):
+        clock = time.time()
+        if clock - self.synced >= LEDGER_FLUSH_SECONDS:
+            self._sync(clock)
+
+    def _window(self, account, window, now):
+        first = int((now - window) // SLOT_SECONDS) + 1
+        return sorted((slot, count) for slot, count in self.counts.get(account, {}).items()
+                      if slot >= first)
+
+    def sent(self, account, window=DAY_SECONDS, now=None):
+        """
+        Messages `account` sent over the last `window` seconds
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            self._refresh()
+            return sum(count for _, count in self._window(account, window, now))
+
+    def allowance(self, account, daily=None, hourly=None, now=None):
+        """
+        (messages `account` may still send now, seconds until it may send
+        again when that is 0) under its `daily` and `hourly` quotas (None =
+        no limit); (None, 0) when it has no quota at all
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            self._refresh()
+            left = None
+            wait = 0.0
+            for quota, window in ((daily, DAY_SECONDS), (hourly, HOUR_SECONDS)):
+                if not quota:
+                    continue
+                slots = self._window(account, window, now)
+                used = sum(count for _, count in slots)
+                left = quota - used if left is None else min(left, quota - used)
+                # The window drops its oldest minutes until it is under quota again
+                for slot, count in slots:
+                    if used < quota:
+                        break
+                    used -= count
+                    wait = max(wait, (slot + 1) * SLOT_SECONDS + window - now)
+            if left is None:
+                return None, 0.0
+            left = max(0, left)
+            return left, (wait if not left else 0.0)
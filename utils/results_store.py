@@ -0,0 +1,166 @@
+import sys
+from array import array
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+# Parquet export needs pyarrow
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+# Final outcome per recipient; same meaning as the delivery journal states
+FAILED, SENT, REJECTED = 0, 1, 2
+OUTCOME_LABELS = {SENT: 'sent', FAILED: 'failed', REJECTED: 'rejected'}
+
+# Code column value for failures that never got an SMTP reply
+NO_CODE = 0
+# Text columns value for "nothing recorded"
+NO_TEXT = -1
+
+
+class ResultsStore:
+    """
+    Per-recipient campaign outcomes kept column by column.
+
+    Outcome, SMTP code and attempt count are small integers in typed
+    arrays, and the repetitive texts (error detail, exception class,
+    enhanced status) are interned once and referenced by id, so a result
+    costs a few dozen bytes instead of a dict of strings. Rows are kept in
+    completion order with the recipient's position in the campaign; views
+    and exports are built a page at a time with to_frame().
+    """
+
+    def __init__(self):
+        self.positions = array('q')
+        self.outcomes = array('b')
+        self.codes = array('h')
+        self.attempts = array('b')
+        self.details = array('i')
+        self.errors = array('i')
+        self.statuses = array('i')
+        self.names = []
+        self.emails = []
+        self.texts = []
+        self.text_ids = {}
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def _intern(self, text):
+        if not text:
+            return NO_TEXT
+        text_id = self.text_ids.get(text)
+        if text_id is None:
+            text_id = self.text_ids[text] = len(self.texts)
+            self.texts.append(text)
+        return text_id
+
+    def append(self, index, result):
+        """
+        Record one campaign_result for the recipient at campaign position `index`
+        """
+        if result['success']:
+            outcome = SENT
+        else:
+            outcome = REJECTED if result.get('transient') is False else FAILED
+        self.positions.append(index)
+        self.outcomes.append(outcome)
+        self.codes.append(result.get('code') or NO_CODE)
+        self.attempts.append(min(result.get('attempts', 1), 127))
+        self.details.append(NO_TEXT if outcome == SENT else self._intern(result.get('detail')))
+        self.errors.append(self._intern(result.get('error')))
+        self.statuses.append(self._intern(result.get('enhanced_status')))
+        self.names.append(result['name'])
+        self.emails.append(result['email'])
+
+    def counts(self):
+        """
+        Recipients per outcome plus how many needed more than one attempt
+        """
+        outcomes = np.frombuffer(self.outcomes, dtype=np.int8)
+        by_outcome = np.bincount(outcomes, minlength=3)
+        return {
+            'total': len(outcomes),
+            'sent': int(by_outcome[SENT]),
+            'failed': int(by_outcome[FAILED]),
+            'rejected': int(by_outcome[REJECTED]),
+            'retried': int(np.count_nonzero(np.frombuffer(self.attempts, dtype=np.int8) > 1)),
+        }
+
+    def failure_reasons(self):
+        """
+        Unsuccessful recipients grouped by outcome, SMTP code, enhanced
+        status and detail, most common first
+        """
+        rows = np.flatnonzero(np.frombuffer(self.outcomes, dtype=np.int8) != SENT)
+        frame = self._columns(rows)
+        if frame.empty:
+            return frame
+        keys = ['Outcome', 'Code', 'Enhanced status', 'Detail']
+        reasons = frame.groupby(keys, dropna=False, observed=True).size().rename('Recipients')
+        return reasons.sort_values(ascending=False).reset_index()
+
+    def select(self, outcomes=None):
+        """
+        Row numbers (in campaign order) whose outcome is in `outcomes`
+        (any of SENT / FAILED / REJECTED; None for all)
+        """
+        order = np.argsort(np.frombuffer(self.positions, dtype=np.int64), kind='stable')
+        if outcomes is None:
+            return order
+        keep = np.isin(np.frombuffer(self.outcomes, dtype=np.int8)[order], list(outcomes))
+        return order[keep]
+
+    def to_frame(self, rows=None):
+        """
+        DataFrame of the given row numbers (see select), all rows in
+        campaign order by default
+        """
+        return self._columns(self.select() if rows is None else rows)
+
+    def _columns(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        # NO_TEXT (-1) picks the trailing None
+        texts = np.array(self.texts + [None], dtype=object)
+
+        def column(values, dtype):
+            return np.frombuffer(values, dtype=dtype)[rows]
+
+        codes = column(self.codes, np.int16)
+        labels = pd.Categorical.from_codes(
+            column(self.outcomes, np.int8), [OUTCOME_LABELS[i] for i in range(3)])
+        return pd.DataFrame({
+            'Name': [self.names[i] for i in rows],
+            'Email': [self.emails[i] for i in rows],
+            'Outcome': labels,
+            'Code': pd.array(np.where(codes == NO_CODE, None, codes), dtype='Int16'),
+            'Enhanced status': texts[column(self.statuses, np.int32)],
+            'Error': texts[column(self.errors, np.int32)],
+            'Detail': texts[column(self.details, np.int32)],
+            'Attempts': column(self.attempts, np.int8),
+        })
+
+    def to_csv(self, rows=None):
+        return self.to_frame(rows).to_csv(index=False).encode('utf-8')
+
+    def to_parquet(self, rows=None):
+        buffer = BytesIO()
+        self.to_frame(rows).to_parquet(buffer, index=False)
+        return buffer.getvalue()
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the store: numeric columns, names and
+        emails, and the interned texts
+        """
+        numeric = sum(column.itemsize * len(column) for column in (
+            self.positions, self.outcomes, self.codes, self.attempts,
+            self.details, self.errors, self.statuses))
+        strings = sum(sys.getsizeof(column) + sum(map(sys.getsizeof, column))
+                      for column in (self.names, self.emails, self.texts))
+        return numeric + strings + sys.getsizeof(self.text_ids)
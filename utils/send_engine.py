@@ -0,0 +1,859 @@
+import heapq
+import itertools
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque, defaultdict
+
+from utils.email_sender import deliver_email, MessageSkeleton, SMTPSession, DEFERRAL_CODES
+from utils.delivery_metrics import profiled
+from utils.quota_ledger import account_quotas
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket enforcing a global send rate.
+
+    `rate` is in messages per second; `burst` is how many messages may go out
+    back to back after an idle period. A rate of None or 0 disables limiting.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        """
+        Change the refill rate without losing the tokens already earned
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens +
+                              (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        Take a token if one is available, otherwise return the seconds to wait
+        """
+        with self.lock:
+            if not self.rate:
+                return 0
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, stop_event=None):
+        """
+        Block until a token is available. Returns False if stopped while waiting.
+        """
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return True
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+# Recipients read ahead of sending so they can be spread across domains
+DOMAIN_WINDOW = 10000
+# ...and handed to the senders at least this many at a time
+READ_AHEAD_BATCH = 256
+
+# How long a sender waits before re-checking domains at their concurrency cap
+DOMAIN_POLL_SECONDS = 0.05
+
+# Longest a waiting sender sleeps before checking whether it was stopped
+STOP_CHECK_SECONDS = 0.5
+
+
+def email_domain(email):
+    return email.rpartition('@')[2].strip().lower()
+
+
+class DomainScheduler:
+    """
+    Hands out recipients so that receiving domains take turns.
+
+    Up to `window` recipients are read ahead from `recipients` (any
+    iterable, including a generator) into one queue per domain, or per
+    `resolver(domain)` key (see mx_resolver.MXResolver); queues are served
+    round-robin. A domain with `max_per_domain` messages in flight, or
+    whose `domain_rate` (messages per second) is used up, is skipped until
+    it frees up, so other domains keep the senders busy. Indexes are
+    positions in `recipients`, like the send engines' own.
+
+    Recipients handed back with retry() wait out their delay and then
+    rejoin their domain's queue ahead of fresh ones, so retries are sent
+    interleaved with the rest of the campaign under the same limits.
+
+    Thread-safe: senders call acquire() (or read_ahead() and poll() from
+    asyncio) and release(key) after each message. Resolving keys happens
+    outside the lock, so a slow MX lookup holds up only the sender doing it.
+    """
+
+    def __init__(self, recipients, resolver=None, max_per_domain=None, domain_rate=None,
+                 window=DOMAIN_WINDOW):
+        self.source = enumerate(recipients)
+        self.resolver = resolver
+        self.max_per_domain = max_per_domain
+        self.domain_rate = domain_rate
+        self.window = window
+        self.queues = {}
+        self.turns = deque()
+        self.in_flight = defaultdict(int)
+        self.active = 0
+        self.limiters = {}
+        self.retries = []
+        self.retry_order = itertools.count()
+        self.buffered = 0
+        self.exhausted = False
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.reading = threading.Lock()
+
+    def _enqueue(self, key, entry, front=False):
+        pending = self.queues.get(key)
+        if pending is None:
+            pending = self.queues[key] = deque()
+            self.turns.append(key)
+        if front:
+            pending.appendleft(entry)
+        else:
+            pending.append(entry)
+        self.buffered += 1
+
+    def wants_read_ahead(self):
+        """
+        Whether read_ahead() has work: the read-ahead buffer is down to
+        half the window and `recipients` is not used up
+        """
+        return not self.exhausted and self.buffered <= self.window // 2
+
+    def read_ahead(self):
+        """
+        Top the buffer up to `window` recipients. Keys are resolved outside
+        the scheduler lock, since a resolver may do DNS lookups, and handed
+        over in batches so senders never wait for a whole window. Only one
+        caller reads at a time; others return at once. The asyncio engine
+        runs this in an executor.
+        """
+        if not self.wants_read_ahead() or not self.reading.acquire(blocking=False):
+            return
+        try:
+            batch = []
+            flushed = time.monotonic()
+            exhausted = False
+            room = self.window - self.buffered
+            while len(batch) < room:
+                try:
+                    index, recipient = next(self.source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                key = email_domain(recipient['email'])
+                if self.resolver is not None:
+                    key = self.resolver(key)
+                batch.append((key, (index, recipient, 1)))
+                if len(batch) >= READ_AHEAD_BATCH or time.monotonic() - flushed >= DOMAIN_POLL_SECONDS:
+                    room -= len(batch)
+                    self._hand_over(batch, False)
+                    batch = []
+                    flushed = time.monotonic()
+            self._hand_over(batch, exhausted)
+        finally:
+            self.reading.release()
+
+    def _hand_over(self, batch, exhausted):
+        with self.changed:
+            for key, entry in batch:
+                self._enqueue(key, entry)
+            self.exhausted = exhausted
+            self.changed.notify_all()
+
+    def _fill(self):
+        now = time.monotonic()
+        while self.retries and self.retries[0][0] <= now:
+            _, _, index, recipient, key, attempt = heapq.heappop(self.retries)
+            self._enqueue(key, (index, recipient, attempt), front=True)
+
+    def _limiter(self, key):
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            limiter = self.limiters[key] = TokenBucket(self.domain_rate)
+        return limiter
+
+    def _next(self):
+        """
+        (item, wait) under the lock: item is (index, recipient, key, attempt)
+        or None; wait is None once every recipient has been handed out and
+        no retry can come back
+        """
+        self._fill()
+        if not self.turns:
+            if self.retries:
+                return None, max(0.0, self.retries[0][0] - time.monotonic())
+            # Messages still in flight may yet be handed back for a retry, and
+            # a read-ahead may be under way
+            return None, (DOMAIN_POLL_SECONDS if self.active or not self.exhausted else None)
+        wait = DOMAIN_POLL_SECONDS
+        for _ in range(len(self.turns)):
+            key = self.turns[0]
+            self.turns.rotate(-1)
+            if self.max_per_domain and self.in_flight[key] >= self.max_per_domain:
+                continue
+            if self.domain_rate:
+                delay = self._limiter(key).reserve()
+                if delay:
+                    wait = min(wait, delay)
+                    continue
+            pending = self.queues[key]
+            index, recipient, attempt = pending.popleft()
+            if not pending:
+                del self.queues[key]
+                self.turns.pop()
+            self.buffered -= 1
+            self.in_flight[key] += 1
+            self.active += 1
+            return (index, recipient, key, attempt), None
+        return None, wait
+
+    def poll(self):
+        """
+        Non-blocking: ((index, recipient, key, attempt), None) when a
+        recipient is ready, (None, seconds) when the caller should try again
+        later, and (None, None) when there are no recipients left. Does not
+        read ahead; call read_ahead() when wants_read_ahead().
+        """
+        with self.lock:
+            return self._next()
+
+    def acquire(self, stop_event=None):
+        """
+        Block until a recipient may be sent; returns (index, recipient, key,
+        attempt) or None when there are none left or `stop_event` is set
+        """
+        while stop_event is None or not stop_event.is_set():
+            self.read_ahead()
+            with self.changed:
+                item, wait = self._next()
+                if item is not None or wait is None:
+                    return item
+                self.changed.wait(min(wait, STOP_CHECK_SECONDS))
+        return None
+
+    def retry(self, index, recipient, key, attempt, delay):
+        """
+        Hand a recipient back to be sent again (as `attempt`) after `delay`
+        seconds. Call before release() for the failed attempt.
+        """
+        with self.changed:
+            heapq.heappush(self.retries, (time.monotonic() + delay, next(self.retry_order),
+                                          index, recipient, key, attempt))
+
+    def release(self, key):
+        with self.changed:
+            self.in_flight[key] -= 1
+            self.active -= 1
+            self.changed.notify_all()
+
+
+# An account that hit its sending quota is left out of rotation this long
+ACCOUNT_REST_SECONDS = 3600.0
+
+# How long a sender waits before re-checking accounts at their concurrency cap
+ACCOUNT_POLL_SECONDS = 0.05
+
+# Replies meaning the account's credentials were refused
+AUTH_CODES = frozenset({530, 534, 535})
+
+# Replies meaning the account has used up what its provider lets it send,
+# e.g. Gmail's "550 5.4.5 Daily user sending limit exceeded" or a 4.7.x
+# "try again later" throttle of the sending account
+QUOTA_STATUSES = frozenset({'5.4.5'})
+QUOTA_STATUS_CLASS = '4.7.'
+QUOTA_PATTERN = re.compile(r'sending (?:quota|limit)|submission ?quota', re.I)
+# Full mailboxes and oversized messages are "over quota" / "limit exceeded"
+# too, but say nothing about the sender
+RECIPIENT_LIMIT_STATUSES = frozenset({'4.2.2', '5.2.2', '5.2.3', '5.3.4'})
+
+
+def quota_status(failure):
+    """
+    Whether a describe_failure dict carries an enhanced status that itself
+    says the sending account is over quota
+    """
+    status = failure['enhanced_status'] or ''
+    return status in QUOTA_STATUSES or status.startswith(QUOTA_STATUS_CLASS)
+
+
+def account_problem(failure):
+    """
+    'auth' or 'quota' when a describe_failure dict blames the sending
+    account rather than the recipient, None otherwise
+    """
+    if failure is None:
+        return None
+    if failure['error'] == 'SMTPAuthenticationError' or failure['code'] in AUTH_CODES:
+        return 'auth'
+    if failure['enhanced_status'] in RECIPIENT_LIMIT_STATUSES:
+        return None
+    if failure['error'] == 'SMTPRecipientsRefused':
+        # Replies to RCPT are about that recipient (greylisting is a 4.7.x
+        # too) unless they say outright that the account is over quota
+        over_quota = failure['enhanced_status'] in QUOTA_STATUSES
+    else:
+        over_quota = quota_status(failure)
+    if over_quota or QUOTA_PATTERN.search(failure['detail'] or ''):
+        return 'quota'
+    return None
+
+
+def _clock_time(seconds_from_now):
+    """
+    Local time of day `seconds_from_now`, with the weekday when not today
+    """
+    moment = time.localtime(time.time() + seconds_from_now)
+    same_day = moment.tm_yday == time.localtime().tm_yday
+    return time.strftime('%H:%M' if same_day else '%a %H:%M', moment)
+
+
+class SenderAccount:
+    """
+    One SMTP identity of a SenderPool.
+
+    `smtp_config` is the same dict the rest of the app uses; its optional
+    'weight' (share of the campaign relative to the other accounts),
+    'max_concurrency' (messages in flight) and 'max_rate' (messages per
+    second) keys set the account's limits, and 'daily_quota' and
+    'hourly_quota' what it may send per rolling window (see
+    quota_ledger.account_quotas).
+    """
+
+    def __init__(self, smtp_config):
+        self.smtp_config = smtp_config
+        self.name = f"{smtp_config['sender_email']} ({smtp_config['host']})"
+        self.weight = max(float(smtp_config.get('weight') or 1), 1e-3)
+        self.max_concurrency = smtp_config.get('max_concurrency') or None
+        self.bucket = TokenBucket(smtp_config.get('max_rate') or None)
+        self.daily_quota, self.hourly_quota = account_quotas(smtp_config)
+        self.in_flight = 0
+        self.assigned = 0
+        self.sent = 0
+        self.failed = 0
+        self.handed_back = 0
+        # 'auth' once the account is out for good; resting until a quota clears
+        self.disabled = None
+        self.resting_until = 0.0
+        self.skeleton = None
+
+
+class SenderPool:
+    """
+    Several SMTP accounts sharing one campaign.
+
+    Each message goes to the usable account furthest behind its weighted
+    share that is under its own concurrency and rate limits, so every
+    account is kept busy up to its limits and throughput adds up across
+    accounts.
+
+    With a `ledger` (a QuotaLedger), accounts with a daily or hourly quota
+    only send what is left of it, counting what they sent in earlier
+    campaigns and other processes. An account that has used its quota sits
+    out until its rolling window frees up again, and when every account
+    has, sending pauses until the first one can go on; the rest of the
+    campaign is deferred rather than discovered to be over quota by
+    rejections.
+
+    An account whose credentials are refused is dropped for the rest of
+    the campaign, and one that reports a sending quota anyway rests for
+    `rest_seconds`; the send engines hand the recipient that hit the
+    problem back to the scheduler so a healthy account sends it. The last
+    account in rotation is never dropped, so a pool of one with bad
+    credentials reports its failures like a plain smtp_config.
+
+    Thread-safe: senders call acquire() (or poll() from asyncio),
+    record(account, success, failure) with each outcome and release(account).
+    """
+
+    def __init__(self, smtp_configs, rest_seconds=ACCOUNT_REST_SECONDS, ledger=None):
+        self.accounts = [SenderAccount(config) for config in smtp_configs]
+        if not self.accounts:
+            raise ValueError("A sender pool needs at least one account")
+        self.rest_seconds = rest_seconds
+        self.ledger = ledger
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def worker_count(self, max_concurrency):
+        """
+        Connections to open: the sum of the accounts' own concurrency
+        limits when every account has one, `max_concurrency` otherwise
+        """
+        limits = [account.max_concurrency for account in self.accounts]
+        if all(limits):
+            return sum(limits)
+        return max(1, max_concurrency)
+
+    def skeleton(self, account, subject, attachments=None):
+        """
+        MessageSkeleton with the account's From header, built once per account
+        """
+        if account.skeleton is None:
+            skeleton = MessageSkeleton(subject, account.smtp_config, attachments)
+            with self.lock:
+                if account.skeleton is None:
+                    account.skeleton = skeleton
+        return account.skeleton
+
+    def _allowance(self, account):
+        """
+        (messages the account may still send, seconds until it may send
+        again when that is 0); (None, 0) without a quota or ledger
+        """
+        if self.ledger is None or not (account.daily_quota or account.hourly_quota):
+            return None, 0.0
+        return self.ledger.allowance(account.name, account.daily_quota, account.hourly_quota)
+
+    def allowance(self):
+        """
+        Messages the pool may send before some quota window has to free
+        up, or None when an account has no quota
+        """
+        total = 0
+        for account in self.accounts:
+            if account.disabled:
+                continue
+            left, _ = self._allowance(account)
+            if left is None:
+                return None
+            total += left
+        return total
+
+    def _next(self):
+        """
+        (account, wait) under the lock: the account to send the next
+        message with, or None and the seconds until one may be free
+        """
+        now = time.monotonic()
+        wait = None
+        # Seconds until each account out of rotation (rest or quota) is back
+        blocked = []
+        candidates = [account for account in self.accounts if not account.disabled]
+        candidates.sort(key=lambda account: account.assigned / account.weight)
+        for account in candidates:
+            if account.resting_until > now:
+                blocked.append(account.resting_until - now)
+                continue
+            left, quota_wait = self._allowance(account)
+            if left is not None and left <= account.in_flight:
+                if left:
+                    wait = ACCOUNT_POLL_SECONDS
+                else:
+                    blocked.append(quota_wait)
+                continue
+            if account.max_concurrency and account.in_flight >= account.max_concurrency:
+                wait = ACCOUNT_POLL_SECONDS
+                continue
+            delay = account.bucket.reserve()
+            if delay:
+                wait = min(wait or delay, delay)
+                continue
+            account.in_flight += 1
+            account.assigned += 1
+            return account, None
+        if wait is None:
+            wait = max(min(blocked), ACCOUNT_POLL_SECONDS)
+        return None, wait
+
+    def poll(self):
+        """
+        Non-blocking: (account, None) when one may send now, (None, seconds)
+        when the caller should try again later, and (None, None) once the
+        pool was cancelled
+        """
+        with self.lock:
+            if self.cancelled:
+                return None, None
+            return self._next()
+
+    def acquire(self, stop_event=None):
+        """
+        Block until an account may send; returns it, or None once
+        `stop_event` is set or the pool was cancelled
+        """
+        with self.changed:
+            while not self.cancelled and (stop_event is None or not stop_event.is_set()):
+                account, wait = self._next()
+                if account is not None:
+                    return account
+                self.changed.wait(min(wait, STOP_CHECK_SECONDS))
+        return None
+
+    def record(self, account, success, failure=None, hand_back=True):
+        """
+        Count one outcome of `account`. Returns 'auth' or 'quota' when the
+        failure was the account's fault and the recipient should be sent
+        again by another account, None when the outcome stands. With
+        `hand_back` False (the recipient is out of attempts) the account is
+        still taken out of rotation but the outcome always stands.
+        """
+        problem = None if success else account_problem(failure)
+        with self.changed:
+            if problem is not None:
+                now = time.monotonic()
+                others = [other for other in self.accounts if other is not account
+                          and not other.disabled and other.resting_until <= now]
+                if account.disabled or account.resting_until > now:
+                    # Already out of rotation; a message that was in flight
+                    if hand_back:
+                        account.handed_back += 1
+                        return problem
+                elif others or (problem == 'quota' and self._exhausted(account, failure)):
+                    if problem == 'auth':
+                        account.disabled = problem
+                    else:
+                        account.resting_until = time.monotonic() + self.rest_seconds
+                    self.changed.notify_all()
+                    if hand_back:
+                        account.handed_back += 1
+                        return problem
+            if success:
+                account.sent += 1
+            else:
+                account.failed += 1
+        if success and self.ledger is not None:
+            self.ledger.record(account.name)
+        return None
+
+    def _exhausted(self, account, failure):
+        """
+        Whether the account's quota is known to be used up: by its ledger,
+        or by a reply status that says so (wording alone is not enough to
+        pause the only account left)
+        """
+        left, _ = self._allowance(account)
+        return left == 0 or quota_status(failure)
+
+    def release(self, account):
+        with self.changed:
+            account.in_flight -= 1
+            self.changed.notify_all()
+
+    def cancel(self):
+        """
+        Make every sender waiting for an account give up, from any thread;
+        the campaign then ends once the messages in flight are done
+        """
+        with self.changed:
+            self.cancelled = True
+            self.changed.notify_all()
+
+    def flush(self):
+        """
+        Write the ledger's pending counts; the engines call this when a campaign ends
+        """
+        if self.ledger is not None:
+            self.ledger.flush()
+
+    def summary(self):
+        """
+        One dict per account: sent, failed and handed-back counts, quota
+        left and whether it is sending, waiting for quota or disabled
+        """
+        now = time.monotonic()
+        with self.lock:
+            rows = []
+            for account in self.accounts:
+                left, quota_wait = self._allowance(account)
+                if account.disabled:
+                    status = "credentials refused"
+                elif account.resting_until > now:
+                    status = f"over quota, resumes {_clock_time(account.resting_until - now)}"
+                elif left == 0:
+                    status = f"quota used, resumes {_clock_time(quota_wait)}"
+                else:
+                    status = "sending"
+                rows.append({
+                    'account': account.name,
+                    'weight': account.weight,
+                    'sent': account.sent,
+                    'failed': account.failed,
+                    'handed_back': account.handed_back,
+                    'quota_left': left,
+                    'status': status,
+                })
+            return rows
+
+
+# Transient failures are retried up to this many attempts in all, after an
+# exponentially growing, jittered delay
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 300.0
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """
+    Seconds to wait after failed attempt number `attempt`: base * 2^(n-1),
+    capped, with the upper half randomized so retries do not arrive in lockstep
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def campaign_result(recipient, success, message, failure, attempts):
+    """
+    Result dict for one recipient. Failures carry the SMTP code, enhanced
+    status, exception class, error text and whether the last error was
+    transient.
+    """
+    result = {
+        'name': recipient['first_name'],
+        'email': recipient['email'],
+        'success': success,
+        'message': message,
+        'code': 250 if success else failure['code'],
+        'attempts': attempts
+    }
+    if failure is not None:
+        result.update(enhanced_status=failure['enhanced_status'],
+                      error=failure['error'], detail=failure['detail'],
+                      transient=failure['transient'])
+    return result
+
+
+# Adaptive rate control: starting rate, floor, additive step (messages per
+# second gained per second of clean sending) and multiplicative back-off
+AIMD_START_RATE = 1.0
+AIMD_MIN_RATE = 0.05
+AIMD_INCREASE = 0.5
+AIMD_DECREASE = 0.5
+
+
+class AIMDRateController:
+    """
+    Additive-increase / multiplicative-decrease control of a TokenBucket.
+
+    Every accepted message (2xx) raises the rate so that it grows by about
+    `increase` messages per second each second; a deferral (421, 450, 451,
+    452) multiplies it by `decrease`. Until the first deferral each
+    accepted message adds `increase` outright (a slow start, as in TCP), so
+    the rate grows exponentially towards the provider's limit. Deferrals
+    that arrive together (from messages already in flight) count as one
+    back-off. The rate stays between `min_rate` and `max_rate` (None = no
+    ceiling).
+    """
+
+    def __init__(self, bucket, start_rate=AIMD_START_RATE, max_rate=None, min_rate=AIMD_MIN_RATE,
+                 increase=AIMD_INCREASE, decrease=AIMD_DECREASE):
+        self.bucket = bucket
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.rate = self._clamp(start_rate)
+        self.backed_off_at = 0.0
+        self.slow_start = True
+        self.deferrals = 0
+        self.lock = threading.Lock()
+        bucket.set_rate(self.rate)
+
+    def _clamp(self, rate):
+        if self.max_rate:
+            rate = min(rate, self.max_rate)
+        return max(self.min_rate, rate)
+
+    def record(self, code):
+        """
+        Adjust the rate for one SMTP reply code (None = no reply)
+        """
+        with self.lock:
+            if code in DEFERRAL_CODES:
+                self.deferrals += 1
+                now = time.monotonic()
+                # One back-off per round trip of messages sent at the old rate
+                if now - self.backed_off_at < 1.0 / self.rate:
+                    return
+                self.backed_off_at = now
+                self.slow_start = False
+                self.rate = self._clamp(self.rate * self.decrease)
+            elif code is not None and 200 <= code < 300:
+                step = self.increase if self.slow_start else self.increase / self.rate
+                self.rate = self._clamp(self.rate + step)
+            else:
+                return
+            self.bucket.set_rate(self.rate)
+
+
+def rate_per_second(max_rate, unit='per second'):
+    """
+    Convert the UI's "max rate" setting into messages per second
+    """
+    if not max_rate:
+        return None
+    if unit == 'per minute':
+        return max_rate / 60.0
+    return float(max_rate)
+
+
+def iter_campaign(recipients, subject, body, smtp_config, attachments=None, format_type='markdown',
+                  max_rate=None, max_concurrency=1, per_domain_concurrency=None, per_domain_rate=None,
+                  resolver=None, adaptive_rate=False, max_attempts=RETRY_MAX_ATTEMPTS,
+                  retry_delay=RETRY_BASE_DELAY, metrics=None, senders=None):
+    """
+    Send to every recipient over `max_concurrency` SMTP connections.
+
+    Each worker thread owns one SMTPSession per sending account; a shared
+    TokenBucket caps the global rate at `max_rate` messages per second.
+    Yields `(index, result)` pairs in completion order, where `result` is
+    the same dict the Send tab summary uses. `recipients` may be any
+    iterable of dicts with 'first_name' and 'email' keys, including a
+    generator; any other keys are available to the template as
+    {placeholders}.
+
+    Recipients are interleaved across receiving domains by a
+    DomainScheduler, which also enforces `per_domain_concurrency` and
+    `per_domain_rate` (messages per second per domain or, with a
+    `resolver`, per mail provider).
+
+    `senders` (a SenderPool) shards the campaign across several accounts
+    instead of sending everything as `smtp_config`; when every account has
+    its own concurrency limit the worker count is their sum (see
+    SenderPool.worker_count). A recipient whose send failed because of the
+    account (refused credentials, exhausted quota) is handed back and sent
+    by another account, immediately but as its next attempt; once it has
+    had `max_attempts` attempts the failure is reported instead.
+
+    With `adaptive_rate`, an AIMDRateController steers the global rate from
+    the SMTP replies, starting low and climbing while the server accepts;
+    `max_rate` is then the ceiling.
+
+    Transient failures (4xx replies, dropped connections, timeouts) are
+    retried up to `max_attempts` attempts in all, after backoff_delay(n,
+    `retry_delay`); permanent ones are reported straight away. Only the
+    final outcome of each recipient is yielded (see campaign_result).
+
+    `metrics` (a DeliveryMetrics) receives per-phase timings, message and
+    connection counts and retries by reply code; each worker thread runs
+    under metrics.profiled().
+    """
+    pool = senders if senders is not None else SenderPool([smtp_config])
+    # Serialize the invariant part of the message once for the whole campaign
+    pool.skeleton(pool.accounts[0], subject, attachments)
+    bucket = TokenBucket(max_rate)
+    controller = AIMDRateController(bucket, max_rate=max_rate) if adaptive_rate else None
+    scheduler = DomainScheduler(recipients, resolver, per_domain_concurrency, per_domain_rate)
+    stop = threading.Event()
+    done = queue.Queue()
+    finished = object()
+
+    def worker():
+        sessions = {}
+        try:
+            with profiled(metrics):
+                while not stop.is_set():
+                    item = scheduler.acquire(stop)
+                    if item is None:
+                        break
+                    index, recipient, domain, attempt = item
+                    retrying = False
+                    try:
+                        account = pool.acquire(stop)
+                        if account is None:
+                            break
+                        try:
+                            if not bucket.acquire(stop):
+                                break
+                            session = sessions.get(account)
+                            if session is None:
+                                session = sessions[account] = SMTPSession(
+                                    account.smtp_config, metrics=metrics)
+                            deferrals = session.deferrals
+                            success, message, failure = deliver_email(
+                                recipient['first_name'],
+                                recipient['email'],
+                                subject,
+                                body,
+                                account.smtp_config,
+                                attachments=attachments,
+                                format_type=format_type,
+                                session=session,
+                                skeleton=pool.skeleton(account, subject, attachments),
+                                fields=recipient,
+                                metrics=metrics
+                            )
+                            if pool.record(account, success, failure,
+                                           hand_back=attempt < max_attempts):
+                                # Another account sends it; this one is out of rotation
+                                sessions.pop(account).close()
+                                scheduler.retry(index, recipient, domain, attempt + 1, 0)
+                                continue
+                        finally:
+                            pool.release(account)
+                        retrying = failure is not None and failure['transient'] and attempt < max_attempts
+                        if retrying:
+                            scheduler.retry(index, recipient, domain, attempt + 1,
+                                            backoff_delay(attempt, retry_delay))
+                            if metrics is not None:
+                                metrics.count_retry(failure['code'])
+                    finally:
+                        scheduler.release(domain)
+                    if controller is not None:
+                        if session.deferrals > deferrals:
+                            # A 421 the session retried through still means "slow down"
+                            controller.record(421)
+                        controller.record(250 if success else failure['code'])
+                    if not retrying:
+                        done.put((index, campaign_result(
+                            recipient, success, message, failure, attempt)))
+        finally:
+            for session in sessions.values():
+                session.close()
+            done.put(finished)
+
+    workers = [threading.Thread(target=worker, daemon=True)
+               for _ in range(pool.worker_count(max_concurrency))]
+    for thread in workers:
+        thread.start()
+
+    running = len(workers)
+    try:
+        while running:
+            item = done.get()
+            if item is finished:
+                running -= 1
+            else:
+                yield item
+    finally:
+        stop.set()
+        for thread in workers:
+            thread.join()
+        pool.flush()
+
+
+def send_campaign(recipients, subject, body, smtp_config, **options):
+    """
+    Send a whole campaign and return the results in recipient order
+    """
+    results = dict(iter_campaign(
+        recipients, subject, body, smtp_config, **options))
+    return [results[i] for i in sorted(results)]
@@ -0,0 +1,273 @@
+import math
+import numpy as np
+import pandas as pd
+from io import BytesIO
+
+from utils.data_loader import EMAIL_PATTERN, STRING_DTYPE, frame_nbytes
+
+# Suppression lists larger than this are held in a Bloom filter instead of a set
+BLOOM_THRESHOLD = 1_000_000
+BLOOM_FALSE_POSITIVE_RATE = 0.001
+
+# pandas needs a 16-character key for its hashing
+_HASH_KEY = 'email-automation'
+
+# Recipients converted to Python values at a time while iterating a SendPlan
+PLAN_CHUNK_ROWS = 10000
+
+# Reasons a row is dropped from the plan, in the order they are checked
+REMOVAL_REASONS = ('invalid', 'duplicate', 'suppressed', 'delivered')
+
+
+def normalize_emails(emails):
+    """
+    Stripped addresses plus their lower-case form used for matching
+    """
+    stripped = emails.astype(STRING_DTYPE).str.strip()
+    return stripped, stripped.str.lower()
+
+
+def hash_emails(normalized):
+    """
+    64-bit hash per normalized address
+    """
+    values = np.asarray(normalized.fillna(''), dtype=object)
+    return pd.util.hash_array(values, hash_key=_HASH_KEY)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over 64-bit email hashes.
+
+    Membership tests are vectorized: the k bit positions come from double
+    hashing the two 32-bit halves of each hash. False positives (a
+    subscriber wrongly treated as suppressed) happen at about
+    `false_positive_rate`; false negatives never happen.
+    """
+
+    def __init__(self, capacity, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, hashes):
+        h1 = (hashes & np.uint64(0xFFFFFFFF)).astype(np.uint64)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rounds = np.arange(self.hash_count, dtype=np.uint64)
+        return (h1[:, None] + rounds[None, :] * h2[:, None]) % np.uint64(self.size)
+
+    def add_hashes(self, hashes):
+        positions = self._positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         (1 << (positions & np.uint64(7))).astype(np.uint8))
+        self.count += len(hashes)
+
+    def contains_hashes(self, hashes):
+        if not len(hashes):
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(hashes)
+        found = self.bits[positions >> np.uint64(3)] & (
+            1 << (positions & np.uint64(7))).astype(np.uint8)
+        return found.all(axis=1)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __len__(self):
+        return self.count
+
+
+class HashSuppression:
+    """
+    Exact suppression set stored as sorted 64-bit hashes
+    """
+
+    def __init__(self, hashes):
+        self.hashes = np.unique(hashes)
+
+    def contains_hashes(self, hashes):
+        return np.isin(hashes, self.hashes, assume_unique=False)
+
+    @property
+    def nbytes(self):
+        return self.hashes.nbytes
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+def load_suppression_list(uploaded_file, bloom_threshold=BLOOM_THRESHOLD):
+    """
+    Load unsubscribed / blocked addresses from a CSV or plain text upload.
+
+    Uses the 'email' column when there is one, otherwise the first column
+    (a text file with one address per line works too). Returns an exact
+    hash set, or a BloomFilter when there are more than `bloom_threshold`
+    addresses.
+    """
+    stream = BytesIO(uploaded_file.getvalue())
+    if uploaded_file.name.endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(stream, dtype=str)
+    else:
+        df = pd.read_csv(stream, dtype=str, header=None, skip_blank_lines=True)
+        first_row = df.iloc[0].astype(str).str.strip().str.lower() if len(df) else None
+        if first_row is not None and not first_row.str.contains('@').any():
+            df.columns = first_row.tolist()
+            df = df.iloc[1:]
+    column = 'email' if 'email' in df.columns else df.columns[0]
+
+    _, normalized = normalize_emails(df[column].dropna())
+    hashes = hash_emails(normalized)
+    if len(hashes) > bloom_threshold:
+        suppression = BloomFilter(len(hashes))
+        suppression.add_hashes(hashes)
+        return suppression
+    return HashSuppression(hashes)
+
+
+class SendPlan:
+    """
+    Compiled list of recipients that survived validation, dedupe and suppression.
+
+    Holds no copy of the contact data: `frame` is the mapped DataFrame cut
+    down to the email and the fields the template uses (its columns are
+    referenced, not copied) and `rows` the positions of the recipients to
+    send to, in order. Iterating yields one recipient dict at a time for
+    the send engines, converting PLAN_CHUNK_ROWS rows at a time to Python
+    values. `removed` counts dropped rows per reason.
+    """
+
+    def __init__(self, frame, rows, removed, total):
+        self.frame = frame
+        self.rows = rows
+        self.removed = removed
+        self.total = total
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        names = [name for name in self.frame.columns if name != 'email']
+        for start in range(0, len(self.rows), PLAN_CHUNK_ROWS):
+            part = self.frame.take(self.rows[start:start + PLAN_CHUNK_ROWS])
+            emails = part['email'].astype(STRING_DTYPE).str.strip().tolist()
+            columns = [_python_values(part[name]) for name in names]
+            for values in zip(emails, *columns):
+                recipient = dict(zip(names, values[1:]))
+                recipient['email'] = values[0]
+                yield recipient
+
+    @property
+    def removed_count(self):
+        return sum(self.removed.values())
+
+    @property
+    def nbytes(self):
+        """
+        Bytes of the plan itself (the row positions); the columns are
+        shared with the loaded contact list
+        """
+        return self.rows.nbytes
+
+    @property
+    def fields_nbytes(self):
+        """
+        Bytes of the contact columns the plan reads from
+        """
+        return frame_nbytes(self.frame)
+
+    def without(self, delivered):
+        """
+        Copy of the plan minus addresses in `delivered` (a hash set from a
+        campaign's delivery journal); they are counted as 'delivered'
+        """
+        _, normalized = normalize_emails(self.frame['email'].take(self.rows))
+        done = delivered.contains_hashes(hash_emails(normalized))
+        removed = dict(self.removed)
+        removed['delivered'] = removed.get('delivered', 0) + int(done.sum())
+        return SendPlan(self.frame, self.rows[~done], removed, self.total)
+
+
+def _python_values(column):
+    """
+    A column as a list of Python values, blanks as ""
+    """
+    values = column.astype(object)
+    return values.where(values.notna(), '').tolist()
+
+
+def _plan_masks(emails, seen=None, suppression=None, delivered=None):
+    """
+    Clean addresses and keep/reason masks for one frame or chunk.
+    `seen` is a set of hashes already planned by earlier chunks;
+    `delivered` holds addresses an earlier run of the campaign reached.
+    """
+    stripped, normalized = normalize_emails(emails)
+    valid = stripped.str.match(EMAIL_PATTERN.pattern).fillna(False).to_numpy(dtype=bool)
+    hashes = hash_emails(normalized)
+
+    # First occurrence wins, within the frame and against earlier chunks
+    duplicate = pd.Series(hashes).duplicated().to_numpy()
+    if seen is not None and seen:
+        duplicate |= np.fromiter((h in seen for h in hashes.tolist()),
+                                 dtype=bool, count=len(hashes))
+    duplicate &= valid
+
+    suppressed = np.zeros(len(hashes), dtype=bool)
+    if suppression is not None:
+        suppressed = suppression.contains_hashes(hashes) & valid & ~duplicate
+
+    already_delivered = np.zeros(len(hashes), dtype=bool)
+    if delivered is not None:
+        already_delivered = delivered.contains_hashes(
+            hashes) & valid & ~duplicate & ~suppressed
+
+    keep = valid & ~duplicate & ~suppressed & ~already_delivered
+    if seen is not None:
+        seen.update(hashes[keep].tolist())
+    return stripped, keep, {
+        'invalid': int((~valid).sum()),
+        'duplicate': int(duplicate.sum()),
+        'suppressed': int(suppressed.sum()),
+        'delivered': int(already_delivered.sum()),
+    }
+
+
+def compile_send_plan(df, fields=('first_name',), suppression=None):
+    """
+    Compile a mapped DataFrame into a SendPlan.
+
+    Rows with a missing or malformed email, repeats of an address already
+    planned (case-insensitive) and addresses in `suppression` are dropped.
+    Only the `fields` the template needs are referenced alongside the emails.
+    """
+    _, keep, removed = _plan_masks(df['email'], suppression=suppression)
+    columns = ['email'] + [field for field in dict.fromkeys(fields)
+                           if field in df.columns and field != 'email']
+    frame = pd.DataFrame({column: df[column] for column in columns}, copy=False)
+    # Positional indexes fit in 32 bits for any list a browser can upload
+    rows = np.flatnonzero(keep).astype(np.int32 if len(df) < 2 ** 31 else np.int64)
+    return SendPlan(frame, rows, removed, len(df))
+
+
+def iter_planned_recipients(chunks, suppression=None, removed=None, delivered=None):
+    """
+    Streaming counterpart of compile_send_plan for mapped chunks (see
+    data_loader.iter_contact_chunks). Duplicates are tracked across chunks
+    through a set of address hashes; `removed` is updated as chunks go by.
+    Addresses in `delivered` (see delivery_journal) are skipped.
+    """
+    seen = set()
+    if removed is None:
+        removed = {}
+    for chunk in chunks:
+        stripped, keep, chunk_removed = _plan_masks(
+            chunk['email'], seen=seen, suppression=suppression, delivered=delivered)
+        for reason, count in chunk_removed.items():
+            removed[reason] = removed.get(reason, 0) + count
+        kept = chunk[keep].copy()
+        kept['email'] = stripped[keep].to_numpy(dtype=object)
+        yield from kept.to_dict('records')
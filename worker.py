@@ -0,0 +1,182 @@
+"""
+Background campaign worker.
+
+Runs campaigns queued from the Streamlit app's Send tab, independently of
+any browser session:
+
+    python worker.py                 # poll the default queue forever
+    python worker.py --once          # run queued jobs, then exit
+    python worker.py --metrics-port 9464   # also serve Prometheus metrics
+
+Start as many workers as you like; each job is claimed by exactly one.
+Delivery metrics for all jobs this worker ran are kept in a Prometheus text
+file (--metrics-file) and, with --metrics-port, served at /metrics.
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.job_queue import (DEFAULT_DB_PATH, STALE_JOB_SECONDS, connect, claim_next_job, load_job,
+                             iter_pending_recipients, record_results, finish_job, requeue_stale_jobs,
+                             touch_job, worker_heartbeat)
+from utils.send_engine import iter_campaign, SenderPool
+from utils.async_sender import iter_campaign_async
+from utils.mx_resolver import MXResolver
+from utils.delivery_metrics import DeliveryMetrics, METRICS_FILE
+from utils.quota_ledger import QuotaLedger
+
+# Outcomes are written to the queue at least this often
+FLUSH_EVERY_RESULTS = 200
+FLUSH_EVERY_SECONDS = 1.0
+
+# A job with nothing to record (e.g. waiting for sender quota) still reports
+# this often, so it is not mistaken for abandoned
+KEEPALIVE_SECONDS = STALE_JOB_SECONDS / 4
+
+
+def run_job(conn, job_id, db_path=DEFAULT_DB_PATH, worker=None, metrics=None,
+            metrics_file=METRICS_FILE):
+    """
+    Send every pending recipient of a job, recording outcomes in batches.
+    Returns the final job status. Delivery figures accumulate in `metrics`,
+    which is written to `metrics_file` with every batch. Messages sent are
+    counted against each sender account's quota in the shared QuotaLedger.
+    """
+    payload, attachments = load_job(conn, job_id)
+    options = dict(payload['options'])
+    engine = iter_campaign_async if options.pop(
+        'engine', 'threads') == 'asyncio' else iter_campaign
+    if options.pop('resolve_mx', False):
+        options['resolver'] = MXResolver()
+    ledger = QuotaLedger()
+    senders = options['senders'] = SenderPool(
+        options.get('senders') or [payload['smtp_config']], ledger=ledger)
+    capture = options.pop('profile', False), options.pop('trace_memory', False)
+    if metrics is None:
+        metrics = DeliveryMetrics()
+    if any(capture):
+        metrics.start_capture(*capture)
+
+    order = []
+    outcomes = []
+    last_flush = time.monotonic()
+    stopped = threading.Event()
+
+    def keep_alive():
+        with closing(connect(db_path)) as own:
+            while not stopped.wait(KEEPALIVE_SECONDS):
+                if touch_job(own, job_id, worker):
+                    # Also reaches a campaign that is only waiting for quota
+                    senders.cancel()
+
+    threading.Thread(target=keep_alive, daemon=True).start()
+    campaign = engine(
+        iter_pending_recipients(job_id, order, db_path),
+        payload['subject'],
+        payload['body'],
+        payload['smtp_config'],
+        attachments=attachments,
+        metrics=metrics,
+        **options
+    )
+    try:
+        for index, result in campaign:
+            outcomes.append(
+                (order[index], result['success'], result['message']))
+            now = time.monotonic()
+            if len(outcomes) >= FLUSH_EVERY_RESULTS or now - last_flush >= FLUSH_EVERY_SECONDS:
+                cancelled = record_results(conn, job_id, outcomes)
+                if worker is not None:
+                    worker_heartbeat(conn, worker)
+                if metrics_file:
+                    metrics.write_prometheus(metrics_file)
+                outcomes = []
+                last_flush = now
+                if cancelled:
+                    return 'cancelled'
+    finally:
+        campaign.close()
+        stopped.set()
+        ledger.close()
+        if outcomes:
+            record_results(conn, job_id, outcomes)
+        if metrics_file:
+            metrics.write_prometheus(metrics_file)
+        if any(capture):
+            metrics.stop_capture()
+            for path in metrics.save_capture(f"job-{job_id}"):
+                print(f"Job {job_id}: wrote {path}")
+    return 'cancelled' if senders.cancelled else 'done'
+
+
+def serve_metrics(metrics, port, host=''):
+    """
+    Serve metrics.to_prometheus() at http://host:port/metrics from a daemon thread
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help="Queue database (default: %(default)s)")
+    parser.add_argument('--poll', type=float, default=2.0,
+                        help="Seconds between queue checks when idle")
+    parser.add_argument('--once', action='store_true',
+                        help="Exit when the queue is empty")
+    parser.add_argument('--metrics-file', default=METRICS_FILE,
+                        help="Prometheus text file kept up to date while sending; give each worker its own (default: %(default)s, '' to disable)")
+    parser.add_argument('--metrics-port', type=int,
+                        help="Serve Prometheus metrics on this port at /metrics")
+    args = parser.parse_args()
+
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Worker {name} watching {args.db}")
+    metrics = DeliveryMetrics()
+    if args.metrics_port:
+        serve_metrics(metrics, args.metrics_port)
+        print(f"Metrics at http://localhost:{args.metrics_port}/metrics")
+    with closing(connect(args.db)) as conn:
+        while True:
+            worker_heartbeat(conn, name)
+            requeue_stale_jobs(conn)
+            job = claim_next_job(conn, name)
+            if job is None:
+                if args.once:
+                    return
+                time.sleep(args.poll)
+                continue
+
+            print(f"Job {job['id']}: sending to {job['total']} recipients")
+            try:
+                status = run_job(conn, job['id'], args.db, name, metrics, args.metrics_file)
+                finish_job(conn, job['id'], status)
+            except Exception as e:
+                finish_job(conn, job['id'], 'failed', str(e))
+                status = 'failed'
+            print(f"Job {job['id']}: {status}")
+
+
+if __name__ == "__main__":
+    main()